@@ -0,0 +1,58 @@
+"""
+JSON helpers that use orjson when it is installed and fall back to the standard library.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None  # type: ignore[assignment]
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """
+    Serialize an object to compact UTF-8 encoded JSON
+
+    Args:
+        obj: Object to serialize
+
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def dumps(obj: Any) -> str:
+    """
+    Serialize an object to a compact JSON string
+
+    Args:
+        obj: Object to serialize
+
+    Returns:
+        str: JSON string
+    """
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Deserialize JSON from a string or UTF-8 encoded bytes
+
+    Args:
+        data: JSON document
+
+    Returns:
+        Any: Deserialized object
+
+    Raises:
+        ValueError: If the document is not valid JSON
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
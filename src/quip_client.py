@@ -1,41 +1,126 @@
 import os
+import re
 import csv
 import io
+import importlib.util
 import logging
 import requests
-from bs4 import BeautifulSoup
-from typing import Optional, List, Dict, Any, Union
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from requests.auth import AuthBase
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer
+from typing import Optional, List, Dict, Any, Iterator, Tuple, Union, TextIO
 from openpyxl import load_workbook
 
+from .cache import LRUCache
+
 # Initialize logger
 logger = logging.getLogger("quip-mcp-server")
 
+# Prefer the C-based lxml parser, falling back to the pure-Python parser if unavailable
+HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+# Byte-range download tuning for XLSX exports
+RANGE_DOWNLOAD_WORKERS = 4
+RANGE_PART_MIN_SIZE = 1024 * 1024  # 1MB
+COPY_BUFFER_SIZE = 1024 * 1024  # 1MB
+
+# Content-Range value of a partial response: bytes {first}-{last}/{total or *}
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+# Only tables and the headings that may name them are needed to locate a sheet
+SHEET_STRAINER = SoupStrainer(['table', 'h1', 'h2', 'h3'])
+
+# Row classification patterns used by extract_sheet_data
+METADATA_ROW_RE = re.compile(r'updated on|created on|modified on|as of', re.IGNORECASE)
+LIST_INDICATOR_RE = re.compile(r'•|-|1[.)]|a\)|i[.)]', re.IGNORECASE)
+SENTENCE_PUNCTUATION_RE = re.compile(r'[.!?]')
+MAX_HEADER_LENGTH = 50
+ZERO_WIDTH_SPACE = '\u200b'
+LIST_ITEM_SPLIT_RE = re.compile(r'([a-y])\)(?=([b-z])\))')
+
+class ListBuffer:
+    """
+    Minimal write-only text buffer that collects written strings in a list
+    and joins them once, avoiding StringIO's incremental buffer growth
+    """
+    def __init__(self) -> None:
+        self.parts: List[str] = []
+
+    def write(self, s: str) -> int:
+        self.parts.append(s)
+        return len(s)
+
+    def getvalue(self) -> str:
+        return ''.join(self.parts)
+
+
+class RangeDownloadError(IOError):
+    """
+    Raised when the server stops honoring byte-range requests during a download
+    """
+
+
+class BearerAuth(AuthBase):
+    """
+    Attach a bearer token to each request, leaving the session's own headers untouched
+    """
+    def __init__(self, access_token: str):
+        self.access_token = access_token
+
+    def __call__(self, request: requests.PreparedRequest) -> requests.PreparedRequest:
+        request.headers['Authorization'] = 'Bearer ' + self.access_token
+        return request
+
+
 class QuipClient:
     """
     Simple Quip API client implementation for the MCP server
     """
-    def __init__(self, access_token: str, base_url: str = "https://platform.quip.com"):
+    def __init__(self, access_token: str, base_url: str = "https://platform.quip.com",
+                 session: Optional[requests.Session] = None,
+                 thread_cache_size: int = 128, thread_cache_ttl: Optional[float] = 60.0):
         """
         Initialize the Quip client with the given access token and base URL
         
         Args:
             access_token: Quip API access token
             base_url: Base URL for the Quip API (default: https://platform.quip.com)
+            session: Shared requests session to reuse (optional). When omitted, a new
+                session with a pooled, retrying HTTP adapter is created. The session is
+                not modified; the token is sent with each request instead.
+            thread_cache_size: Maximum number of thread responses to cache
+            thread_cache_ttl: Seconds a cached thread response stays valid (None to never expire)
         """
         self.access_token = access_token
         self.base_url = base_url.rstrip('/')
-        self.session = requests.Session()
-        self.session.headers = {
-            'Authorization': 'Bearer ' + access_token
-        }
+        if session is None:
+            session = create_session()
+        self.session = session
+        self.auth = BearerAuth(access_token)
+        self.thread_cache = LRUCache(maxsize=thread_cache_size, ttl=thread_cache_ttl)
+        # A thread's type never changes, so these results do not expire
+        self.spreadsheet_cache = LRUCache(maxsize=1024)
         logger.info(f"QuipClient initialized with base URL: {self.base_url}")
 
-    def get_thread(self, thread_id: str) -> Dict[str, Any]:
+    def clear_cache(self) -> None:
+        """
+        Drop all cached thread responses and spreadsheet checks
+        """
+        self.thread_cache.clear()
+        self.spreadsheet_cache.clear()
+
+    def get_thread(self, thread_id: str, refresh: bool = False) -> Dict[str, Any]:
         """
         Get a thread by ID
         
+        Responses are cached per thread ID so that back-to-back calls (such as
+        is_spreadsheet followed by export_thread_to_csv_fallback) make one request.
+        
         Args:
             thread_id: ID of the thread to retrieve
+            refresh: Bypass the cache and fetch the thread again
             
         Returns:
             Dict containing thread information
@@ -43,18 +128,33 @@ class QuipClient:
         Raises:
             requests.exceptions.HTTPError: If the request fails
         """
+        if not refresh:
+            thread = self.thread_cache.get(thread_id)
+            if thread is not None:
+                logger.debug(f"Using cached thread: {thread_id}")
+                return thread
+        
         logger.info(f"Getting thread: {thread_id}")
-        response = self.session.get(f"{self.base_url}/1/threads/{thread_id}")
+        response = self.session.get(f"{self.base_url}/1/threads/{thread_id}", auth=self.auth)
         response.raise_for_status()
-        return response.json()
+        thread = response.json()
+        self.thread_cache.set(thread_id, thread)
+        return thread
 
-    def export_thread_to_xlsx(self, thread_id: str, output_path: str) -> str:
+    def export_thread_to_xlsx(self, thread_id: str, output_path: str, max_workers: int = RANGE_DOWNLOAD_WORKERS) -> str:
         """
         Export a thread to XLSX format and save it locally.
         
+        The export is requested with a single GET. When the response shows that the
+        server accepts byte ranges, reports the size and has an ETag or Last-Modified
+        value to validate them with, only the first RANGE_PART_MIN_SIZE bytes are read
+        from it and the rest is downloaded as byte ranges over concurrent connections;
+        otherwise the whole body is streamed from that response.
+        
         Args:
             thread_id: ID of the thread to export
             output_path: Local file path where the XLSX file should be saved
+            max_workers: Maximum number of concurrent range downloads
             
         Returns:
             str: Path to the saved XLSX file
@@ -63,24 +163,114 @@ class QuipClient:
             requests.exceptions.HTTPError: If the request fails
         """
         logger.info(f"Exporting thread {thread_id} to XLSX")
+        url = f"{self.base_url}/1/threads/{thread_id}/export/xlsx"
+        
+        # Ensure the directory exists
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        
         response = self.session.get(
-            f"{self.base_url}/1/threads/{thread_id}/export/xlsx",
+            url,
+            # XLSX is already zip-compressed, so ask for the raw bytes
+            headers={'Accept-Encoding': 'identity'},
+            auth=self.auth,
             stream=True  # Stream the response to handle large files
         )
         response.raise_for_status()
         
-        # Ensure the directory exists
-        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
-        
-        # Write the file in chunks to handle large files efficiently
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+        content_length = response.headers.get('Content-Length', '')
+        total_size = int(content_length) if content_length.isdigit() else None
+        validator = get_range_validator(response.headers)
+        if (response.headers.get('Accept-Ranges') == 'bytes' and validator
+                and total_size is not None and total_size > RANGE_PART_MIN_SIZE):
+            # Keep the first part of this response and preallocate the rest so each
+            # range worker can write at its own offset
+            with open(output_path, 'wb', buffering=COPY_BUFFER_SIZE) as f:
+                received = copy_response_body(response, f, RANGE_PART_MIN_SIZE)
+                response.close()
+                f.truncate(total_size)
+            try:
+                if received != RANGE_PART_MIN_SIZE:
+                    raise RangeDownloadError(f"Response ended after {received} of {total_size} bytes")
+                self._download_ranges(url, output_path, RANGE_PART_MIN_SIZE, total_size, validator, max_workers)
+            except RangeDownloadError as e:
+                logger.warning(f"Range download failed, downloading sequentially: {str(e)}")
+                self._download_sequential(url, output_path)
+        else:
+            # Write the file in large chunks to handle large files efficiently
+            with open(output_path, 'wb', buffering=COPY_BUFFER_SIZE) as f:
+                copy_response_body(response, f)
         
         logger.info(f"Successfully exported XLSX to {output_path}")
         return output_path
 
+    def _download_ranges(self, url: str, output_path: str, start: int, total_size: int, validator: str, max_workers: int) -> None:
+        """
+        Download the bytes from start to the end of a file as concurrent byte ranges
+        
+        Every range request carries If-Range with the given validator, so a changed
+        file is reported as an error instead of being stitched together from
+        different versions. Each response must cover exactly the requested range.
+        
+        Args:
+            url: URL of the file to download
+            output_path: Existing local file, preallocated to total_size, to write into
+            start: Offset of the first byte to download
+            total_size: Total size of the file in bytes
+            validator: ETag or Last-Modified value of the file
+            max_workers: Maximum number of concurrent range downloads
+            
+        Raises:
+            requests.exceptions.HTTPError: If any range request fails
+            RangeDownloadError: If the server does not honor a range request
+        """
+        remaining = total_size - start
+        part_count = max(1, min(max_workers, -(-remaining // RANGE_PART_MIN_SIZE)))
+        part_size = -(-remaining // part_count)
+        ranges = [(part_start, min(part_start + part_size, total_size) - 1)
+                  for part_start in range(start, total_size, part_size)]
+        logger.info(f"Downloading {remaining} of {total_size} bytes in {len(ranges)} ranges")
+        
+        def fetch(byte_range):
+            range_start, range_end = byte_range
+            headers = {'Range': f'bytes={range_start}-{range_end}', 'If-Range': validator, 'Accept-Encoding': 'identity'}
+            response = self.session.get(url, headers=headers, auth=self.auth, stream=True)
+            response.raise_for_status()
+            if response.status_code != 206:
+                response.close()
+                raise RangeDownloadError(f"Server did not honor range request bytes={range_start}-{range_end}")
+            content_range = parse_content_range(response.headers.get('Content-Range'))
+            if content_range != (range_start, range_end, total_size):
+                response.close()
+                raise RangeDownloadError(
+                    f"Server answered range request bytes={range_start}-{range_end} with "
+                    f"Content-Range {response.headers.get('Content-Range')}"
+                )
+            with open(output_path, 'r+b', buffering=COPY_BUFFER_SIZE) as f:
+                f.seek(range_start)
+                received = copy_response_body(response, f, range_end - range_start + 1)
+            if received != range_end - range_start + 1:
+                raise RangeDownloadError(f"Range bytes={range_start}-{range_end} ended after {received} bytes")
+        
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            # Consume the results so worker exceptions propagate
+            list(executor.map(fetch, ranges))
+
+    def _download_sequential(self, url: str, output_path: str) -> None:
+        """
+        Download a whole file in a single streamed request
+        
+        Args:
+            url: URL of the file to download
+            output_path: Local file path to write to
+            
+        Raises:
+            requests.exceptions.HTTPError: If the request fails
+        """
+        response = self.session.get(url, headers={'Accept-Encoding': 'identity'}, auth=self.auth, stream=True)
+        response.raise_for_status()
+        with open(output_path, 'wb', buffering=COPY_BUFFER_SIZE) as f:
+            copy_response_body(response, f)
+
     def export_thread_to_csv_fallback(self, thread_id: str, sheet_name: Optional[str] = None) -> str:
         """
         Export a thread to CSV format using HTML parsing as fallback method.
@@ -116,39 +306,126 @@ class QuipClient:
             raise ValueError(f"No data found in sheet '{sheet_name or 'default'}'")
 
         # Convert to CSV string
-        csv_buffer = io.StringIO()
+        csv_buffer = ListBuffer()
         writer = csv.writer(csv_buffer, quoting=csv.QUOTE_MINIMAL)
         
         # Write all rows
-        for row in data:
-            writer.writerow(row)
+        writer.writerows(data)
         
-        csv_data = csv_buffer.getvalue()
-        csv_buffer.close()
-        
-        return csv_data
+        return csv_buffer.getvalue()
 
     def is_spreadsheet(self, thread_id: str) -> bool:
         """
         Check if a thread is a spreadsheet
         
+        Results from successful lookups are cached per thread ID; failed lookups are
+        retried on the next call.
+        
         Args:
             thread_id: ID of the thread to check
             
         Returns:
             bool: True if the thread is a spreadsheet, False otherwise
         """
+        cached = self.spreadsheet_cache.get(thread_id)
+        if cached is not None:
+            return cached
+        
         try:
             thread = self.get_thread(thread_id)
-            if not thread or 'thread' not in thread:
-                return False
-                
-            # Check if the thread type is 'spreadsheet'
-            thread_type = thread.get('thread', {}).get('type', '').lower()
-            return thread_type == 'spreadsheet'
         except Exception as e:
             logger.error(f"Error checking if thread is spreadsheet: {str(e)}")
             return False
+        
+        if not thread or 'thread' not in thread:
+            result = False
+        else:
+            # Check if the thread type is 'spreadsheet'
+            thread_type = thread.get('thread', {}).get('type', '').lower()
+            result = thread_type == 'spreadsheet'
+        
+        self.spreadsheet_cache.set(thread_id, result)
+        return result
+
+
+def copy_response_body(response: requests.Response, f: Any, size: Optional[int] = None) -> int:
+    """
+    Copy a streamed response body into a binary file object
+    
+    Args:
+        response: Streamed requests response
+        f: Binary file object to write to
+        size: Maximum number of bytes to copy (optional, the whole body if None)
+        
+    Returns:
+        int: Number of bytes copied
+    """
+    # Let urllib3 undo any content encoding while reading the raw stream
+    response.raw.decode_content = True
+    copied = 0
+    while size is None or copied < size:
+        chunk = response.raw.read(COPY_BUFFER_SIZE if size is None else min(COPY_BUFFER_SIZE, size - copied))
+        if not chunk:
+            break
+        f.write(chunk)
+        copied += len(chunk)
+    return copied
+
+
+def parse_content_range(content_range: Optional[str]) -> Optional[Tuple[int, int, Optional[int]]]:
+    """
+    Parse a Content-Range header value
+    
+    Args:
+        content_range: Header value such as "bytes 0-99/12345" (optional)
+        
+    Returns:
+        Optional[Tuple[int, int, Optional[int]]]: First byte, last byte and total size
+            (None if unknown), or None if the value is not a satisfied byte range
+    """
+    match = CONTENT_RANGE_RE.match(content_range or '')
+    if not match:
+        return None
+    first, last, total = match.groups()
+    return int(first), int(last), None if total == '*' else int(total)
+
+
+def get_range_validator(headers: Any) -> Optional[str]:
+    """
+    Get the value to send as If-Range so that byte ranges all come from one version of a file
+    
+    Args:
+        headers: Response headers
+        
+    Returns:
+        Optional[str]: Strong ETag, else Last-Modified, or None if neither is available
+    """
+    etag = headers.get('ETag')
+    # If-Range only accepts strong ETags
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified')
+
+
+def create_session(pool_connections: int = 10, pool_maxsize: int = 20) -> requests.Session:
+    """
+    Create a requests session with keep-alive connection pooling and retries
+    
+    Args:
+        pool_connections: Number of connection pools to cache
+        pool_maxsize: Maximum number of connections to keep per pool
+        
+    Returns:
+        requests.Session: Configured session
+    """
+    # Hand the last retryable response back instead of raising RetryError, so callers'
+    # raise_for_status() still reports it as an HTTPError
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
 
 
 def find_sheet_by_name(document_html: str, sheet_name: Optional[str] = None) -> Optional[Any]:
@@ -162,7 +439,7 @@ def find_sheet_by_name(document_html: str, sheet_name: Optional[str] = None) ->
     Returns:
         BeautifulSoup table element or None if not found
     """
-    soup = BeautifulSoup(document_html, 'html.parser')
+    soup = BeautifulSoup(document_html, HTML_PARSER, parse_only=SHEET_STRAINER)
     
     # First try to find a table with the specified title attribute
     table = soup.find('table', attrs={'title': sheet_name}) if sheet_name else None
@@ -197,9 +474,7 @@ def is_metadata_row(row: List[str]) -> bool:
         return True
         
     # Check for date patterns that suggest metadata
-    date_indicators = ["updated on", "created on", "modified on", "as of"]
-    row_text = " ".join(row).lower()
-    if any(indicator in row_text for indicator in date_indicators):
+    if METADATA_ROW_RE.search(" ".join(row)):
         return True
         
     return False
@@ -222,25 +497,21 @@ def is_header_row(row: List[str]) -> bool:
     # 1. No very long text fields
     # 2. No common sentence punctuation
     # 3. No numbered lists or bullet points
-    max_header_length = 50
-    sentence_punctuation = ['.', '!', '?']
-    list_indicators = ['•', '-', '1)', 'a)', '1.', 'i.', 'i)']
-    
     for cell in row:
         cell = cell.strip()
         if not cell:
             continue
             
         # Check length
-        if len(cell) > max_header_length:
+        if len(cell) > MAX_HEADER_LENGTH:
             return False
             
         # Check for sentence punctuation (excluding abbreviations)
-        if any(p in cell[1:-1] for p in sentence_punctuation):
+        if SENTENCE_PUNCTUATION_RE.search(cell, 1, len(cell) - 1):
             return False
             
         # Check for list indicators
-        if any(cell.lower().startswith(indicator) for indicator in list_indicators):
+        if LIST_INDICATOR_RE.match(cell):
             return False
     
     return True
@@ -250,6 +521,9 @@ def extract_sheet_data(sheet: Any) -> List[List[str]]:
     """
     Extract data from a sheet element
     
+    Rows are cleaned and classified as metadata, header or data in a single
+    traversal of the table.
+    
     Args:
         sheet: BeautifulSoup table element
         
@@ -259,113 +533,184 @@ def extract_sheet_data(sheet: Any) -> List[List[str]]:
     if sheet is None:
         return []
     
-    # Process rows to find header and data rows
-    rows_data = []
-    for tr in sheet.find_all('tr'):
-        cols = tr.find_all('td')
-        if not cols:
-            continue
-            
-        # Get row text
-        row_text = [col.get_text().strip() for col in cols]
+    metadata_rows: List[List[str]] = []   # Leading metadata rows, always kept
+    pending_rows: List[List[str]] = []    # Rows seen before a header; used as data if no header is found
+    header_row: Optional[List[str]] = None
+    feature_col_idx: Optional[int] = None
+    data_rows: List[List[str]] = []
+    
+    for row_data in iter_sheet_rows(sheet):
+        if header_row is not None:
+            # Add data rows (process special formatting for Feature to Address column)
+            if not is_metadata_row(row_data):
+                processed_row = process_data_row(row_data, feature_col_idx)
+                if any(processed_row):  # Only add non-empty rows
+                    data_rows.append(processed_row)
+        elif not pending_rows and is_metadata_row(row_data):
+            # Skip metadata rows at the start
+            metadata_rows.append(row_data)
+        elif is_header_row(row_data):
+            header_row = row_data
+            feature_col_idx = header_row.index('Feature to Address') if 'Feature to Address' in header_row else None
+            # Rows between the metadata and the header are dropped
+            pending_rows = []
+        else:
+            pending_rows.append(row_data)
+    
+    if header_row is None:
+        if not pending_rows:
+            return []
+        # If no header row found, treat the non-metadata rows as data
+        for row_data in pending_rows:
+            if not is_metadata_row(row_data) and any(row_data):
+                data_rows.append(row_data)
+        return metadata_rows + data_rows
+    
+    return metadata_rows + [header_row] + data_rows
+
+
+def iter_sheet_rows(sheet: Any) -> Iterator[List[str]]:
+    """
+    Yield the cleaned, non-empty rows of a sheet element
+    
+    Row-number cells and empty cells are dropped and zero-width spaces removed.
+    
+    Args:
+        sheet: BeautifulSoup table element
         
-        # Skip empty rows
-        if not any(text for text in row_text):
-            continue
-            
-        # Clean up row - remove row numbers and empty columns
-        cleaned_row = []
-        for text in row_text:
-            if text and not text.isdigit():
-                # Remove any zero-width spaces and extra whitespace
-                text = text.replace('\u200b', '').strip()
-                cleaned_row.append(text)
-        
-        if cleaned_row:
-            rows_data.append(cleaned_row)
-    
-    # Process collected rows
-    if not rows_data:
-        return []
+    Yields:
+        List of cell values for each non-empty row
+    """
+    # Walk rows and cells in one traversal, grouping cells under the latest row
+    cells: List[str] = []
+    for element in sheet.find_all(['tr', 'td']):
+        if element.name == 'tr':
+            if cells:
+                row = clean_row_cells(cells)
+                if row:
+                    yield row
+            cells = []
+        else:
+            cells.append(element.get_text().strip())
+    if cells:
+        row = clean_row_cells(cells)
+        if row:
+            yield row
+
+
+def clean_row_cells(cells: List[str]) -> List[str]:
+    """
+    Clean up a row - remove row numbers, empty columns and zero-width spaces
+    
+    Args:
+        cells: Stripped text of each cell in the row
         
-    # Skip metadata rows at the start
-    start_idx = 0
-    while start_idx < len(rows_data) and is_metadata_row(rows_data[start_idx]):
-        start_idx += 1
+    Returns:
+        List[str]: Cleaned cell values
+    """
+    # Cells are already stripped; only re-clean the rare ones holding zero-width spaces
+    return [
+        text.replace(ZERO_WIDTH_SPACE, '').strip() if ZERO_WIDTH_SPACE in text else text
+        for text in cells
+        if text and not text.isdigit()
+    ]
+
+
+def split_list_item(match: re.Match) -> str:
+    """
+    Insert a newline after a list item marker when the next marker is the following letter
+    
+    Args:
+        match: Match of LIST_ITEM_SPLIT_RE
         
-    if start_idx >= len(rows_data):
-        return []
+    Returns:
+        str: Replacement text
+    """
+    if ord(match.group(2)) == ord(match.group(1)) + 1:
+        return match.group(1) + ')\n'
+    return match.group(0)
+
+
+def process_data_row(row_data: List[str], feature_col_idx: Optional[int]) -> List[str]:
+    """
+    Apply special formatting to a data row
+    
+    Args:
+        row_data: Cleaned cell values
+        feature_col_idx: Index of the 'Feature to Address' column, if any
         
-    # Find header row
-    header_idx = start_idx
-    while header_idx < len(rows_data):
-        if is_header_row(rows_data[header_idx]):
-            header_row = rows_data[header_idx]
-            feature_col_idx = header_row.index('Feature to Address') if 'Feature to Address' in header_row else None
-            break
-        header_idx += 1
-    else:
-        # If no header row found, use the first non-metadata row
-        header_idx = start_idx - 1
-        feature_col_idx = None
-    
-    # Create the final rows list
-    rows = []
-    
-    # Include any metadata rows at the start
-    for i in range(start_idx):
-        rows.append(rows_data[i])
-    
-    # Add header row if found
-    if header_idx >= start_idx:
-        rows.append(rows_data[header_idx])
-    
-    # Add data rows (process special formatting for Feature to Address column)
-    for row_data in rows_data[header_idx + 1:]:
-        if not is_metadata_row(row_data):
-            processed_row = []
-            for col_idx, cell in enumerate(row_data):
-                cell_text = cell.strip()
-                
-                # Special handling for Feature to Address column
-                if feature_col_idx is not None and col_idx == feature_col_idx:
-                    # Handle lists specially
-                    if cell_text.startswith('a)'):
-                        # Already in a)b)c) format, just ensure proper newlines
-                        for i in range(97, 122):  # ASCII 'a' to 'z'
-                            char = chr(i)
-                            next_char = chr(i+1)
-                            cell_text = cell_text.replace(f"{char}){next_char})", f"{char})\n{next_char})")
-                
-                processed_row.append(cell_text)
-            
-            if any(cell.strip() for cell in processed_row):  # Only add non-empty rows
-                rows.append(processed_row)
+    Returns:
+        List[str]: Processed cell values
+    """
+    if feature_col_idx is None or feature_col_idx >= len(row_data):
+        return row_data
     
-    return rows
+    processed_row = list(row_data)
+    cell_text = processed_row[feature_col_idx]
+    # Handle lists specially
+    if cell_text.startswith('a)'):
+        # Already in a)b)c) format, just ensure proper newlines between consecutive items
+        cell_text = LIST_ITEM_SPLIT_RE.sub(split_list_item, cell_text)
+    processed_row[feature_col_idx] = cell_text
+    return processed_row
 
 
-def convert_xlsx_to_csv(xlsx_path: str, sheet_name: Optional[str] = None) -> str:
+def convert_xlsx_to_csv(xlsx_path: str, sheet_name: Optional[str] = None, out: Optional[TextIO] = None) -> Optional[str]:
     """
     Convert XLSX file to CSV format, optionally extracting a specific sheet.
     
     Args:
         xlsx_path: Path to the XLSX file
         sheet_name: Name of the sheet to extract (optional)
+        out: Text file-like object to stream CSV rows into (optional). Files should
+            be opened with newline='' as for csv.writer.
         
     Returns:
-        str: CSV data as string
+        Optional[str]: CSV data as string, or None when written to `out`
         
     Raises:
         ValueError: If the sheet is not found
     """
     logger.info(f"Reading XLSX file from {xlsx_path}")
     
-    # Load the workbook with all data
-    wb = load_workbook(filename=xlsx_path, read_only=False, data_only=True)
+    # Load the workbook in read-only mode to stream rows instead of building every cell
+    wb = load_workbook(filename=xlsx_path, read_only=True, data_only=True)
+    try:
+        target_sheet = select_worksheet(wb, sheet_name)
+        
+        # Convert to CSV, writing rows straight to the destination when one is given;
+        # otherwise collect the lines and join them once at the end
+        csv_buffer = ListBuffer()
+        csv_writer = csv.writer(csv_buffer if out is None else out)
+        
+        # Write all rows in one call while streaming them from the sheet
+        csv_writer.writerows(iter_worksheet_rows(target_sheet))
+        
+        # Get the CSV data
+        csv_data = csv_buffer.getvalue() if out is None else None
+    finally:
+        wb.close()
     
+    return csv_data
+
+
+def select_worksheet(workbook: Any, sheet_name: Optional[str] = None) -> Any:
+    """
+    Select a worksheet by name, falling back to the active sheet when no name is given
+    
+    Args:
+        workbook: openpyxl workbook
+        sheet_name: Name of the sheet to select (optional, matched case-insensitively
+            when there is no exact match)
+        
+    Returns:
+        openpyxl worksheet
+        
+    Raises:
+        ValueError: If the sheet is not found
+    """
     # Get available sheet names
-    sheet_names = wb.sheetnames
+    sheet_names = workbook.sheetnames
     logger.info(f"Available sheets: {', '.join(sheet_names)}")
     
     # Determine which sheet to use
@@ -373,54 +718,83 @@ def convert_xlsx_to_csv(xlsx_path: str, sheet_name: Optional[str] = None) -> str
     if sheet_name:
         # Try exact match first
         if sheet_name in sheet_names:
-            target_sheet = wb[sheet_name]
+            target_sheet = workbook[sheet_name]
         else:
             # Try case-insensitive match
             sheet_lower = sheet_name.lower()
             for s in sheet_names:
                 if s.lower() == sheet_lower:
-                    target_sheet = wb[s]
+                    target_sheet = workbook[s]
                     break
             
             if not target_sheet:
                 raise ValueError(f"Sheet '{sheet_name}' not found. Available sheets: {', '.join(sheet_names)}")
     else:
         # Use first sheet if no name specified
-        target_sheet = wb.active
+        target_sheet = workbook.active
+    
+    return target_sheet
+
+
+def iter_xlsx_csv_lines(xlsx_path: str, sheet_name: Optional[str] = None) -> Iterator[str]:
+    """
+    Yield the rows of an XLSX sheet as formatted CSV lines, one row at a time
     
-    # Convert to CSV
-    csv_buffer = io.StringIO()
-    csv_writer = csv.writer(csv_buffer)
+    The workbook stays open until the generator is exhausted or closed.
     
-    # Get all column letters from sheet dimensions
-    from openpyxl.utils import get_column_letter
-    max_col = 0
-    for col in target_sheet.columns:
-        max_col = max(max_col, col[0].column)
+    Args:
+        xlsx_path: Path to the XLSX file
+        sheet_name: Name of the sheet to extract (optional)
+        
+    Yields:
+        CSV line for each row, including its line terminator
+        
+    Raises:
+        ValueError: If the sheet is not found
+    """
+    logger.info(f"Reading XLSX file from {xlsx_path}")
     
+    wb = load_workbook(filename=xlsx_path, read_only=True, data_only=True)
+    try:
+        target_sheet = select_worksheet(wb, sheet_name)
+        
+        # Format each row through one reusable buffer
+        line_buffer = io.StringIO()
+        csv_writer = csv.writer(line_buffer)
+        for row_data in iter_worksheet_rows(target_sheet):
+            csv_writer.writerow(row_data)
+            yield line_buffer.getvalue()
+            line_buffer.seek(0)
+            line_buffer.truncate()
+    finally:
+        wb.close()
+
+
+def iter_worksheet_rows(worksheet: Any):
+    """
+    Yield the values of each worksheet row as CSV-ready strings
+    
+    Args:
+        worksheet: openpyxl worksheet
+        
+    Yields:
+        List of cell values for each row, padded to the sheet width
+    """
+    max_col = worksheet.max_column or 0
     logger.info(f"Found {max_col} columns")
-    column_letters = [get_column_letter(i) for i in range(1, max_col + 1)]
     
     # Process each row
-    for row_idx, row in enumerate(target_sheet.rows, 1):
-        # Get values for all possible columns
-        row_data = []
-        for col in column_letters:
-            cell = target_sheet[f"{col}{row_idx}"]
-            value = cell.value
-            if isinstance(value, str):
-                value = value.strip()
-            row_data.append('' if value is None else str(value))
+    for row_idx, row in enumerate(worksheet.iter_rows(values_only=True), 1):
+        row_data = [
+            '' if value is None else (value.strip() if isinstance(value, str) else str(value))
+            for value in row
+        ]
+        # Pad short rows to the full sheet width
+        if len(row_data) < max_col:
+            row_data.extend([''] * (max_col - len(row_data)))
             
         # Log first few rows for debugging
         if row_idx <= 5:
             logger.info(f"Row {row_idx} data: {row_data}")
             
-        csv_writer.writerow(row_data)
-    
-    # Get the CSV data
-    csv_data = csv_buffer.getvalue()
-    csv_buffer.close()
-    wb.close()
-    
-    return csv_data
+        yield row_data
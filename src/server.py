@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 import os
+import re
 import sys
 import logging
 import asyncio
 import argparse
-from typing import Any, List, Sequence, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Sequence, Optional
 from urllib.parse import urlparse, parse_qs
 
 import mcp.server.stdio
@@ -15,7 +17,7 @@ from mcp.types import Resource, TextContent, ImageContent, EmbeddedResource, Res
 from dotenv import load_dotenv
 
 from .version import __version__
-from .tools import get_quip_tools, handle_quip_read_spreadsheet
+from .tools import get_quip_tools, handle_quip_read_spreadsheet, resource_cache
 from .storage import create_storage, StorageInterface
 
 # Load environment variables from .env file if it exists
@@ -56,6 +58,12 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
+# Number of threads used to read resource metadata during discovery
+METADATA_WORKERS = 8
+
+# Stored CSV filenames: {thread_id}.csv or {thread_id}-{sheet_name}.csv
+CSV_FILENAME_RE = re.compile(r'^([^-]+)(?:-(.+))?\.csv$')
+
 # Global storage instance
 storage_instance: Optional[StorageInterface] = None
 
@@ -207,7 +215,10 @@ async def async_main(args):
         try:
             if name == "quip_read_spreadsheet":
                 global storage_instance
-                return await handle_quip_read_spreadsheet(arguments, storage_instance)
+                result = await handle_quip_read_spreadsheet(arguments, storage_instance)
+                # The stored CSV may have changed; drop cached resource content
+                resource_cache.clear()
+                return result
             else:
                 raise ValueError(f"Unknown tool: {name}")
         except Exception as e:
@@ -249,63 +260,102 @@ async def discover_resources(isFileProtocol: bool) -> List[Resource]:
         logger.warning("Storage is not LocalStorage, cannot discover resources")
         return []
     
-    resources = []
-    storage_path = storage_instance.storage_path
-    
     try:
-        # Scan storage directory for CSV files
-        for filename in os.listdir(storage_path):
-            if filename.endswith(".csv") and not filename.endswith(".meta"):
-                # Parse filename to get thread_id and sheet_name
-                file_path = os.path.join(storage_path, filename)
-                
-                # Extract thread_id and sheet_name from filename
-                if "-" in filename:
-                    # Format: {thread_id}-{sheet_name}.csv
-                    thread_id = filename.split("-")[0]
-                    sheet_name = "-".join(filename.split("-")[1:]).replace(".csv", "")
-                else:
-                    # Format: {thread_id}.csv
-                    thread_id = filename.replace(".csv", "")
-                    sheet_name = None
-                
-                # Get metadata
-                metadata = storage_instance.get_metadata(thread_id, sheet_name)
-                
-                # Create resource URI
-                if isFileProtocol:
-                    resource_uri = f"file://{file_path}"
-                else:
-                    # Use resource template to create resource URI
-                    resource_uri = storage_instance.get_resource_uri(thread_id, sheet_name)
-                
-                # Create resource name
-                resource_name = f"Quip Thread(Spreadsheet): {thread_id}"
-                if sheet_name:
-                    resource_name += f" (Sheet: {sheet_name})"
-                if isFileProtocol:
-                    resource_name += f" You can access the file at: {file_path}"
-                
-                # Create resource description
-                description = f"CSV data from Quip spreadsheet. {metadata.get('total_rows', 0)} rows, {metadata.get('total_size', 0)} bytes."
-                
-                # Create resource
-                resource = Resource(
-                    uri=resource_uri,
-                    name=resource_name,
-                    description=description,
-                    mime_type="text/csv"
-                )
-                
-                resources.append(resource)
-                logger.info(f"Discovered resource: {resource_uri}")
-    
+        # Scan off the event loop so other requests keep being served
+        resources = await asyncio.to_thread(scan_resources, storage_instance, storage_instance.storage_path, isFileProtocol)
     except Exception as e:
         logger.error(f"Error discovering resources: {str(e)}")
+        resources = []
     
     logger.info(f"Discovered {len(resources)} resources")
     return resources
 
+
+def scan_resources(storage: StorageInterface, storage_path: str, isFileProtocol: bool) -> List[Resource]:
+    """
+    Scan the storage directory and build resources for the stored CSV files
+    
+    Args:
+        storage: Storage instance
+        storage_path: Directory the storage keeps its CSV files in
+        isFileProtocol: Whether to use file:// resource URIs
+        
+    Returns:
+        List[Resource]: List of available resources
+    """
+    # Scan storage directory for CSV files and parse each filename once
+    candidates = []
+    with os.scandir(storage_path) as entries:
+        for entry in entries:
+            # Format: {thread_id}-{sheet_name}.csv or {thread_id}.csv
+            match = CSV_FILENAME_RE.match(entry.name)
+            if not match:
+                continue
+            candidates.append((entry.name, entry.path, match.group(1), match.group(2)))
+    
+    # Take metadata from the directory index when available (one read for all files)
+    index = storage.get_index() if hasattr(storage, "get_index") else {}
+    metadata_by_name = {candidate[0]: index[candidate[0]] for candidate in candidates if candidate[0] in index}
+    missing = [candidate for candidate in candidates if candidate[0] not in metadata_by_name]
+    
+    # Read remaining metadata concurrently since each lookup is file I/O
+    with ThreadPoolExecutor(max_workers=METADATA_WORKERS) as executor:
+        missing_metadata = executor.map(
+            lambda candidate: storage.get_metadata(candidate[2], candidate[3]),
+            missing
+        )
+        for candidate, metadata in zip(missing, missing_metadata):
+            metadata_by_name[candidate[0]] = metadata
+    
+    return [
+        build_resource(storage, isFileProtocol, file_path, thread_id, sheet_name, metadata_by_name[file_name])
+        for file_name, file_path, thread_id, sheet_name in candidates
+    ]
+
+def build_resource(
+    storage: StorageInterface,
+    isFileProtocol: bool,
+    file_path: str,
+    thread_id: str,
+    sheet_name: Optional[str],
+    metadata: Dict[str, Any]
+) -> Resource:
+    """
+    Build the resource for a stored CSV file
+    
+    Args:
+        storage: Storage instance
+        isFileProtocol: Whether to use file:// resource URIs
+        file_path: Path of the CSV file
+        thread_id: Quip thread ID
+        sheet_name: Sheet name (optional)
+        metadata: Metadata for the CSV file
+        
+    Returns:
+        Resource: Resource for the CSV file
+    """
+    # Create resource URI
+    if isFileProtocol:
+        resource_uri = f"file://{file_path}"
+    else:
+        # Use resource template to create resource URI
+        resource_uri = storage.get_resource_uri(thread_id, sheet_name)
+    
+    # Create resource name
+    resource_name = f"Quip Thread(Spreadsheet): {thread_id}"
+    if sheet_name:
+        resource_name += f" (Sheet: {sheet_name})"
+    if isFileProtocol:
+        resource_name += f" You can access the file at: {file_path}"
+    
+    logger.info(f"Discovered resource: {resource_uri}")
+    return Resource(
+        uri=resource_uri,
+        name=resource_name,
+        description=f"CSV data from Quip spreadsheet. {metadata.get('total_rows', 0)} rows, {metadata.get('total_size', 0)} bytes.",
+        mime_type="text/csv"
+    )
+
 async def access_resource(uri: str) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
     """
     Handle resource access requests
@@ -341,9 +391,16 @@ async def access_resource(uri: str) -> Sequence[TextContent | ImageContent | Emb
     if not storage_instance:
         raise RuntimeError("Storage not initialized")
     
-    csv_content = storage_instance.get_csv(thread_id, sheet_name)
-    if not csv_content:
-        raise ValueError(f"Resource not found: {uri}")
+    cache_key = (thread_id, sheet_name)
+    csv_content = resource_cache.get(cache_key)
+    if csv_content is None:
+        # A tool call may replace the stored CSV while it is read; clearing the cache
+        # then bumps its generation, so the possibly stale content is not cached
+        generation = resource_cache.generation
+        csv_content = await asyncio.to_thread(storage_instance.get_csv, thread_id, sheet_name)
+        if not csv_content:
+            raise ValueError(f"Resource not found: {uri}")
+        resource_cache.set(cache_key, csv_content, generation)
     
     # Return the full CSV content
     return [TextContent(type="text", text=csv_content)]
@@ -1,19 +1,35 @@
 import os
-import json
 import logging
+import tempfile
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - fcntl is unavailable on Windows
+    fcntl = None  # type: ignore[assignment]
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, Tuple
 from urllib.parse import quote
 
+from .cache import LRUCache
+from . import jsonutil
+
 # Initialize logger
 logger = logging.getLogger("quip-mcp-server")
 
+# Name of the file holding metadata for every CSV in the storage directory
+INDEX_FILENAME = "_index.json"
+
+# Chunk size for reading stored CSV files
+READ_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# Maps characters that are invalid in file names to underscores
+SHEET_NAME_TRANSLATION = str.maketrans({'/': '_', '\\': '_'})
+
 class StorageInterface(ABC):
     """
     Abstract base class for storage interface, defining standard methods for storage operations
     """
     @abstractmethod
-    def save_csv(self, thread_id: str, sheet_name: Optional[str], csv_content: str) -> str:
+    def save_csv(self, thread_id: str, sheet_name: Optional[str], csv_content: str) -> Tuple[str, Dict[str, Any]]:
         """
         Save CSV content
         
@@ -23,10 +39,29 @@ class StorageInterface(ABC):
             csv_content: CSV content
             
         Returns:
-            str: Resource identifier (such as file path or object URL)
+            Tuple[str, Dict[str, Any]]: Resource identifier (such as file path or object URL)
+                and the metadata computed for the saved content
         """
         pass
     
+    def save_csv_stream(self, thread_id: str, sheet_name: Optional[str], row_iter: Iterable[str]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Save CSV content produced incrementally
+        
+        The default implementation joins the chunks and calls save_csv; storage backends
+        can override it to write the chunks as they arrive.
+        
+        Args:
+            thread_id: Quip document thread ID
+            sheet_name: Sheet name (optional)
+            row_iter: CSV text chunks, such as formatted rows including their line terminators
+            
+        Returns:
+            Tuple[str, Dict[str, Any]]: Resource identifier (such as file path or object URL)
+                and the metadata computed for the saved content
+        """
+        return self.save_csv(thread_id, sheet_name, ''.join(row_iter))
+    
     @abstractmethod
     def get_csv(self, thread_id: str, sheet_name: Optional[str] = None) -> Optional[str]:
         """
@@ -83,6 +118,10 @@ class LocalStorage(StorageInterface):
         """
         self.storage_path = storage_path
         self.is_file_protocol = is_file_protocol
+        self.metadata_cache = LRUCache(maxsize=1024)
+        self.path_cache = LRUCache(maxsize=1024)
+        # Directory prefix with exactly one trailing separator, for cheap path building
+        self.storage_path_prefix = os.path.join(storage_path, "")
         os.makedirs(storage_path, exist_ok=True)
         logger.info(f"LocalStorage initialized with path: {storage_path}, is_file_protocol: {is_file_protocol}")
     
@@ -97,15 +136,18 @@ class LocalStorage(StorageInterface):
         Returns:
             str: File path
         """
-        file_name = f"{thread_id}"
-        if sheet_name:
-            # Replace invalid filename characters
-            safe_sheet_name = sheet_name.replace('/', '_').replace('\\', '_')
-            file_name += f"-{safe_sheet_name}"
-        file_name += ".csv"
-        return os.path.join(self.storage_path, file_name)
+        key = (thread_id, sheet_name)
+        file_path = self.path_cache.get(key)
+        if file_path is None:
+            if sheet_name:
+                # Replace invalid filename characters
+                file_path = f"{self.storage_path_prefix}{thread_id}-{sheet_name.translate(SHEET_NAME_TRANSLATION)}.csv"
+            else:
+                file_path = f"{self.storage_path_prefix}{thread_id}.csv"
+            self.path_cache.set(key, file_path)
+        return file_path
     
-    def save_csv(self, thread_id: str, sheet_name: Optional[str], csv_content: str) -> str:
+    def save_csv(self, thread_id: str, sheet_name: Optional[str], csv_content: str) -> Tuple[str, Dict[str, Any]]:
         """
         Save CSV content to local file
         
@@ -115,26 +157,94 @@ class LocalStorage(StorageInterface):
             csv_content: CSV content
             
         Returns:
-            str: File path
+            Tuple[str, Dict[str, Any]]: File path and metadata
         """
         file_path = self.get_file_path(thread_id, sheet_name)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(csv_content)
         
-        # Calculate and save metadata
-        metadata = {
-            "total_rows": len(csv_content.splitlines()),
-            "total_size": len(csv_content),
-            "resource_uri": self.get_resource_uri(thread_id, sheet_name)
-        }
+        # Encode once and write in binary mode, skipping the incremental text encoder
+        csv_bytes = csv_content.encode('utf-8')
+        fd, csv_tmp_path = create_temp_file(file_path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(csv_bytes)
+            
+            # Calculate and save metadata
+            metadata = {
+                "total_rows": count_rows(csv_content),
+                "total_size": len(csv_bytes),
+                "resource_uri": self.get_resource_uri(thread_id, sheet_name)
+            }
+            
+            self.publish_csv(thread_id, sheet_name, csv_tmp_path, metadata)
+        except BaseException:
+            discard_temp_file(csv_tmp_path)
+            raise
+        return file_path, dict(metadata)
+    
+    def save_csv_stream(self, thread_id: str, sheet_name: Optional[str], row_iter: Iterable[str]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Save CSV content to local file as it is produced, counting rows and bytes while writing
         
-        # Save metadata to a separate file
-        metadata_path = file_path + ".meta"
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f)
+        Args:
+            thread_id: Quip document thread ID
+            sheet_name: Sheet name (optional)
+            row_iter: CSV text chunks, such as formatted rows including their line terminators
+            
+        Returns:
+            Tuple[str, Dict[str, Any]]: File path and metadata
+        """
+        file_path = self.get_file_path(thread_id, sheet_name)
+        fd, csv_tmp_path = create_temp_file(file_path)
+        
+        # Keep the same counts as count_rows: newlines, plus an unterminated last line
+        newlines = 0
+        size = 0
+        last_chunk = ""
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in row_iter:
+                    if not chunk:
+                        continue
+                    data = chunk.encode('utf-8')
+                    f.write(data)
+                    newlines += chunk.count('\n')
+                    size += len(data)
+                    last_chunk = chunk
+            
+            metadata = {
+                "total_rows": newlines + (0 if not last_chunk or last_chunk.endswith('\n') else 1),
+                "total_size": size,
+                "resource_uri": self.get_resource_uri(thread_id, sheet_name)
+            }
+            
+            self.publish_csv(thread_id, sheet_name, csv_tmp_path, metadata)
+        except BaseException:
+            discard_temp_file(csv_tmp_path)
+            raise
+        return file_path, dict(metadata)
+    
+    def publish_csv(self, thread_id: str, sheet_name: Optional[str], csv_tmp_path: str, metadata: Dict[str, Any]) -> None:
+        """
+        Move a fully written temporary CSV file into place and record its metadata
+        
+        Args:
+            thread_id: Quip document thread ID
+            sheet_name: Sheet name (optional)
+            csv_tmp_path: Path of the temporary CSV file, in the storage directory
+            metadata: Metadata for the CSV content
+        """
+        file_path = self.get_file_path(thread_id, sheet_name)
+        
+        # Publish the metadata before the CSV so a CSV file never exists without it
+        write_file_atomic(file_path + ".meta", format_metadata(metadata))
+        os.replace(csv_tmp_path, file_path)
+        
+        self.metadata_cache.set((thread_id, sheet_name), metadata)
+        
+        # Record the metadata in the directory index used for resource discovery
+        self.update_index(os.path.basename(file_path), metadata)
         
         logger.info(f"Saved CSV to {file_path} ({metadata['total_size']} bytes, {metadata['total_rows']} rows)")
-        return file_path
     
     def get_csv(self, thread_id: str, sheet_name: Optional[str] = None) -> Optional[str]:
         """
@@ -148,14 +258,31 @@ class LocalStorage(StorageInterface):
             Optional[str]: CSV content, or None if file doesn't exist
         """
         file_path = self.get_file_path(thread_id, sheet_name)
-        if not os.path.exists(file_path):
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+        except FileNotFoundError:
             logger.warning(f"CSV file not found: {file_path}")
             return None
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        # Read raw bytes in large chunks and decode once at the end
+        buf = bytearray()
+        try:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            while True:
+                chunk = os.read(fd, READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                buf += chunk
+        finally:
+            os.close(fd)
+        
+        content = buf.decode('utf-8')
+        # Normalize line endings as text-mode reads do
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
         
-        logger.info(f"Retrieved CSV from {file_path} ({len(content)} bytes)")
+        logger.info(f"Retrieved CSV from {file_path} ({len(buf)} bytes)")
         return content
     
     def get_resource_uri(self, thread_id: str, sheet_name: Optional[str] = None) -> str:
@@ -186,40 +313,87 @@ class LocalStorage(StorageInterface):
         Returns:
             Dict[str, Any]: Metadata including total_rows, total_size, etc.
         """
+        # Serve repeat lookups from memory; copies keep callers from mutating the cache
+        cache_key = (thread_id, sheet_name)
+        cached = self.metadata_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+        
         file_path = self.get_file_path(thread_id, sheet_name)
         metadata_path = file_path + ".meta"
         
-        if not os.path.exists(metadata_path):
+        # Read metadata from file, relying on the open itself to detect a missing file.
+        # save_csv publishes metadata before the CSV, so missing metadata means no CSV.
+        try:
+            with open(metadata_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
             logger.warning(f"Metadata file not found: {metadata_path}")
-            # If metadata file doesn't exist but CSV file does, generate metadata
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                metadata = {
-                    "total_rows": len(content.splitlines()),
-                    "total_size": len(content),
-                    "resource_uri": self.get_resource_uri(thread_id, sheet_name)
-                }
-                
-                # Save the generated metadata
-                with open(metadata_path, 'w', encoding='utf-8') as f:
-                    json.dump(metadata, f)
-                
-                return metadata
-            
-            # If neither file exists, return empty metadata
             return {
                 "total_rows": 0,
                 "total_size": 0,
                 "resource_uri": self.get_resource_uri(thread_id, sheet_name)
             }
         
-        # Read metadata from file
-        with open(metadata_path, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
+        if data.startswith(b'{'):
+            # Read metadata written in the legacy JSON format as is; it is replaced by
+            # the next save of the CSV, so this read path never writes
+            metadata = jsonutil.loads(data)
+        else:
+            metadata = parse_metadata(data)
+        
+        self.metadata_cache.set(cache_key, metadata)
+        return dict(metadata)
+    
+    def get_index_path(self) -> str:
+        """
+        Get the path of the directory index file
+        
+        Returns:
+            str: Index file path
+        """
+        return os.path.join(self.storage_path, INDEX_FILENAME)
+    
+    def update_index(self, file_name: str, metadata: Dict[str, Any]) -> None:
+        """
+        Add or update an entry in the directory index
+        
+        Args:
+            file_name: Name of the CSV file in the storage directory
+            metadata: Metadata for the CSV file
+        """
+        # Open without truncating so the exclusive lock is held across read-modify-write
+        with open(self.get_index_path(), 'a+', encoding='utf-8') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                index = jsonutil.loads(f.read() or "{}")
+            except ValueError:
+                logger.warning("Storage index is corrupt, rebuilding it")
+                index = {}
+            index[file_name] = metadata
+            f.seek(0)
+            f.truncate()
+            f.write(jsonutil.dumps(index))
+    
+    def get_index(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the directory index mapping CSV file names to their metadata
         
-        return metadata
+        Returns:
+            Dict[str, Dict[str, Any]]: Index entries, or an empty dict if there is no usable index
+        """
+        try:
+            with open(self.get_index_path(), 'r', encoding='utf-8') as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_SH)
+                return jsonutil.loads(f.read())
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.warning("Storage index is corrupt, ignoring it")
+            return {}
 
 
 def create_storage(storage_type: str = "local", **kwargs) -> StorageInterface:
@@ -245,6 +419,107 @@ def create_storage(storage_type: str = "local", **kwargs) -> StorageInterface:
         raise ValueError(f"Unsupported storage type: {storage_type}")
 
 
+def write_file_atomic(path: str, data: bytes) -> None:
+    """
+    Write a file atomically by writing a temporary file and renaming it into place
+    
+    Args:
+        path: Destination file path
+        data: File content
+    """
+    fd, tmp_path = create_temp_file(path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        discard_temp_file(tmp_path)
+        raise
+
+
+def create_temp_file(path: str) -> Tuple[int, str]:
+    """
+    Create a uniquely named temporary file next to a destination path
+    
+    Each writer gets its own temporary file, so concurrent saves of the same path
+    cannot interleave their writes or rename each other's files.
+    
+    Args:
+        path: Destination file path
+        
+    Returns:
+        Tuple[int, str]: Open file descriptor and path of the temporary file
+    """
+    directory, name = os.path.split(path)
+    return tempfile.mkstemp(dir=directory or None, prefix=f"{name}.", suffix=".tmp")
+
+
+def discard_temp_file(path: str) -> None:
+    """
+    Remove a temporary file if it still exists
+    
+    Args:
+        path: Path of the temporary file
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def format_metadata(metadata: Dict[str, Any]) -> bytes:
+    """
+    Serialize CSV metadata to the two-line metadata file format
+    
+    The first line holds the row count and byte size separated by a space, and the
+    second line holds the resource URI.
+    
+    Args:
+        metadata: Metadata with total_rows, total_size and resource_uri
+        
+    Returns:
+        bytes: Metadata file content
+    """
+    return f"{metadata['total_rows']} {metadata['total_size']}\n{metadata['resource_uri']}".encode('utf-8')
+
+
+def parse_metadata(data: bytes) -> Dict[str, Any]:
+    """
+    Parse metadata file content written by format_metadata
+    
+    Args:
+        data: Metadata file content
+        
+    Returns:
+        Dict[str, Any]: Metadata with total_rows, total_size and resource_uri
+        
+    Raises:
+        ValueError: If the content is not in the metadata file format
+    """
+    counts, resource_uri = data.decode('utf-8').split('\n', 1)
+    total_rows, total_size = counts.split(' ')
+    return {
+        "total_rows": int(total_rows),
+        "total_size": int(total_size),
+        "resource_uri": resource_uri
+    }
+
+
+def count_rows(csv_content: str) -> int:
+    """
+    Count the lines in CSV content without splitting it into a list
+    
+    Args:
+        csv_content: CSV content
+        
+    Returns:
+        int: Number of lines, counting a final line without a trailing newline
+    """
+    if not csv_content:
+        return 0
+    return csv_content.count('\n') + (0 if csv_content.endswith('\n') else 1)
+
+
 def truncate_csv_content(csv_content: str, max_size: int = 10 * 1024) -> tuple[str, bool]:
     """
     Truncate CSV content to be under the specified maximum size
@@ -256,25 +531,27 @@ def truncate_csv_content(csv_content: str, max_size: int = 10 * 1024) -> tuple[s
     Returns:
         tuple[str, bool]: Truncated CSV content and a boolean indicating if truncation occurred
     """
-    if len(csv_content) <= max_size:
+    # A prefix of max_size characters holds at least max_size UTF-8 bytes, so only it
+    # needs encoding; a newline byte never falls inside a multi-byte character
+    prefix = csv_content[:max_size].encode('utf-8')
+    if len(csv_content) <= max_size and len(prefix) <= max_size:
         return csv_content, False
     
-    lines = csv_content.splitlines()
-    header = lines[0] if lines else ""
-    
-    # Always include the header
-    result = [header]
-    current_size = len(header) + 1  # +1 for newline
-    
-    # Add as many data rows as possible without exceeding max_size
-    for i in range(1, len(lines)):
-        line_size = len(lines[i]) + 1  # +1 for newline
-        if current_size + line_size > max_size:
-            break
-        
-        result.append(lines[i])
-        current_size += line_size
+    # Keep as many complete rows as fit, cutting at the last newline before max_size
+    cut = prefix.rfind(b'\n', 0, max_size)
+    if cut == -1:
+        # Always include the header, even when it alone exceeds max_size
+        cut = csv_content.find('\n')
+        if cut == -1:
+            cut = len(csv_content)
+        if cut > 0 and csv_content[cut - 1] == '\r':
+            cut -= 1
+        truncated_content = csv_content[:cut]
+    else:
+        if cut > 0 and prefix[cut - 1] == 0x0D:  # '\r'
+            cut -= 1
+        truncated_content = prefix[:cut].decode('utf-8')
     
-    truncated_content = "\n".join(result)
-    logger.info(f"Truncated CSV from {len(csv_content)} bytes to {len(truncated_content)} bytes")
-    return truncated_content, True
\ No newline at end of file
+    # Character counts, since encoding the whole content only to log its size would be wasteful
+    logger.info(f"Truncated CSV from {len(csv_content)} characters to {len(truncated_content)} characters")
+    return truncated_content, True
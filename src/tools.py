@@ -1,21 +1,133 @@
 import os
-import json
+import asyncio
+import atexit
+import functools
+import itertools
+import shutil
+import threading
 import tempfile
 import logging
-from typing import Dict, Any, List, Optional, Sequence
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 from mcp.types import Tool, TextContent, ImageContent, EmbeddedResource
 
-from .quip_client import QuipClient, convert_xlsx_to_csv
+from .quip_client import QuipClient, iter_xlsx_csv_lines
 from .storage import StorageInterface, truncate_csv_content
+from .cache import LRUCache
+from . import jsonutil
 
 # Initialize logger
 logger = logging.getLogger("quip-mcp-server")
 
+# Maximum size of CSV content returned inline in the tool response
+MAX_SIZE = 10 * 1024  # 10KB
+
+# Recently read resource content, keyed by (thread_id, sheet_name); cleared whenever
+# a tool call may have replaced the stored CSV
+resource_cache = LRUCache(maxsize=32, ttl=60)
+
+# Exports currently running, keyed by credentials, thread and sheet, so concurrent
+# requests for the same sheet await one result
+inflight_exports: Dict[Tuple[str, str, str, Optional[str]], "asyncio.Task[Sequence[TextContent]]"] = {}
+
+def get_temp_xlsx_path() -> str:
+    """
+    Get the temporary XLSX path for the current thread
+    
+    The path is reused across requests handled by the same thread, each export
+    overwriting the previous one, and lives in a private directory of this process
+    that is removed at exit.
+    
+    Returns:
+        str: Path of the temporary XLSX file
+    """
+    return os.path.join(get_temp_xlsx_dir(os.getpid()), f"{threading.get_ident()}.xlsx")
+
+@functools.lru_cache(maxsize=None)
+def get_temp_xlsx_dir(pid: int) -> str:
+    """
+    Create the private directory for a process's XLSX exports, scheduling its removal at exit
+    
+    The directory is created with mode 0700 under an unpredictable name, so other
+    local users can neither read the exports nor plant files at their paths.
+    
+    Args:
+        pid: Process ID
+        
+    Returns:
+        str: Path of the temporary directory
+    """
+    path = tempfile.mkdtemp(prefix="quip-mcp-xlsx-")
+    atexit.register(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+def export_sheet_via_xlsx(client: QuipClient, storage: StorageInterface, thread_id: str, sheet_name: Optional[str]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Export a thread to XLSX and stream the requested sheet into storage as CSV
+    
+    Runs both steps in the calling thread so they share its temporary XLSX path. Rows
+    are written to storage as they are converted, so the full CSV is never held in
+    memory; only the leading rows needed for the inline response are kept.
+    
+    Args:
+        client: Quip client
+        storage: Storage interface for saving CSV content
+        thread_id: Quip thread ID
+        sheet_name: Sheet name (optional)
+        
+    Returns:
+        Tuple[str, Optional[Dict[str, Any]]]: Leading CSV content, with more than MAX_SIZE
+            characters unless it is the whole sheet, and the metadata of the saved CSV
+            (None when the sheet is empty and nothing was saved)
+    """
+    xlsx_path = get_temp_xlsx_path()
+    client.export_thread_to_xlsx(thread_id, xlsx_path)
+    
+    # Convert XLSX to CSV, reading the first row up front so a missing sheet or an
+    # empty one never replaces the stored copy
+    logger.info(f"Converting sheet '{sheet_name or 'default'}' from XLSX to CSV")
+    lines = iter_xlsx_csv_lines(xlsx_path, sheet_name)
+    first_line = next(lines, None)
+    if first_line is None:
+        return "", None
+    
+    prefix_lines: List[str] = []
+    prefix_size = 0
+    
+    def collect_prefix(csv_lines: Iterable[str]) -> Iterator[str]:
+        nonlocal prefix_size
+        for line in csv_lines:
+            if prefix_size <= MAX_SIZE:
+                prefix_lines.append(line)
+                prefix_size += len(line)
+            yield line
+    
+    _, metadata = storage.save_csv_stream(thread_id, sheet_name, collect_prefix(itertools.chain([first_line], lines)))
+    return "".join(prefix_lines), metadata
+
+@functools.lru_cache(maxsize=4)
+def get_quip_client(access_token: str, base_url: str) -> QuipClient:
+    """
+    Get a Quip client for the given token and base URL, created once and reused
+    
+    The client's session and thread cache are safe to share across tool calls.
+    
+    Args:
+        access_token: Quip API access token
+        base_url: Base URL for the Quip API
+        
+    Returns:
+        QuipClient: Cached client instance
+    """
+    return QuipClient(access_token=access_token, base_url=base_url)
+
+@functools.lru_cache(maxsize=1)
 def get_quip_tools() -> List[Tool]:
     """
     Get the list of Quip tools available in this MCP server
 
+    The list is built once and shared by every call, so callers must not modify it.
+
     Returns:
         List of Tool objects
     """
@@ -68,28 +180,67 @@ async def handle_quip_read_spreadsheet(arguments: Dict[str, Any], storage: Stora
     if not quip_token:
         raise ValueError("QUIP_TOKEN environment variable is not set")
     
-    # Initialize Quip client
-    client = QuipClient(access_token=quip_token, base_url=quip_base_url)
+    # Get the Quip client, reusing the one built for this token and base URL
+    client = get_quip_client(quip_token, quip_base_url)
+    
+    # Let concurrent requests for the same sheet share a single export. The lookup and
+    # the insert run without an await in between, so no lock is needed. The export runs
+    # as its own task and every caller awaits it through a shield, so cancelling one
+    # request leaves the others waiting on the export.
+    key = (quip_token, quip_base_url, thread_id, sheet_name)
+    task = inflight_exports.get(key)
+    if task is None:
+        task = asyncio.create_task(read_spreadsheet(client, storage, thread_id, sheet_name))
+        inflight_exports[key] = task
+        task.add_done_callback(functools.partial(finish_export, key))
+    else:
+        logger.info(f"Waiting for in-flight export of thread {thread_id}, sheet: {sheet_name or 'default'}")
     
-    # Check if the thread is a spreadsheet
-    if not client.is_spreadsheet(thread_id):
+    return await asyncio.shield(task)
+
+def finish_export(key: Tuple[str, str, str, Optional[str]], task: "asyncio.Task[Sequence[TextContent]]") -> None:
+    """
+    Forget a finished export so the next request for its sheet runs a new one
+    
+    Args:
+        key: Key of the export in inflight_exports
+        task: Finished export task
+    """
+    inflight_exports.pop(key, None)
+    # Mark the exception as retrieved in case every waiter was cancelled
+    if not task.cancelled():
+        task.exception()
+
+async def read_spreadsheet(client: QuipClient, storage: StorageInterface, thread_id: str, sheet_name: Optional[str]) -> Sequence[TextContent]:
+    """
+    Export a spreadsheet sheet and build the quip_read_spreadsheet response
+    
+    Args:
+        client: Quip client
+        storage: Storage interface for saving and retrieving CSV content
+        thread_id: Quip thread ID
+        sheet_name: Sheet name (optional)
+        
+    Returns:
+        List of TextContent objects
+        
+    Raises:
+        ValueError: If the thread is not a spreadsheet or the export fails
+    """
+    # Check if the thread is a spreadsheet; blocking work below runs in worker threads
+    # so the event loop can serve other tool calls meanwhile
+    if not await asyncio.to_thread(client.is_spreadsheet, thread_id):
         raise ValueError(f"Thread {thread_id} is not a spreadsheet or does not exist")
     
     # Try primary export method first
     csv_data = None
+    metadata: Optional[Dict[str, Any]] = None
     error_message = None
     
     try:
-        # Export thread to XLSX first
+        # Export thread to XLSX first, saving the CSV while it is converted
         logger.info(f"Attempting primary export method: XLSX for thread {thread_id}")
-        with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as temp_file:
-            xlsx_path = temp_file.name
-        
-        client.export_thread_to_xlsx(thread_id, xlsx_path)
-        
-        # Convert XLSX to CSV
-        logger.info(f"Converting sheet '{sheet_name or 'default'}' from XLSX to CSV")
-        csv_data = convert_xlsx_to_csv(xlsx_path, sheet_name)
+        csv_data, metadata = await asyncio.to_thread(export_sheet_via_xlsx, client, storage, thread_id, sheet_name)
         
     except Exception as e:
         error_message = str(e)
@@ -98,31 +249,23 @@ async def handle_quip_read_spreadsheet(arguments: Dict[str, Any], storage: Stora
         
         try:
             # Try fallback method
-            csv_data = client.export_thread_to_csv_fallback(thread_id, sheet_name)
+            csv_data = await asyncio.to_thread(client.export_thread_to_csv_fallback, thread_id, sheet_name)
             logger.info("Successfully exported using fallback method")
         except Exception as fallback_error:
             logger.error(f"Fallback export method also failed: {str(fallback_error)}")
             raise ValueError(f"Failed to export spreadsheet. Primary error: {error_message}, Fallback error: {str(fallback_error)}")
-    finally:
-        # Clean up temporary XLSX file if it exists
-        if 'xlsx_path' in locals() and os.path.exists(xlsx_path):
-            try:
-                os.remove(xlsx_path)
-                logger.info(f"Cleaned up temporary XLSX file: {xlsx_path}")
-            except Exception as e:
-                logger.warning(f"Failed to clean up temporary XLSX file: {str(e)}")
     
     if not csv_data:
         raise ValueError("Failed to export data: no CSV content generated")
     
-    # Save the full CSV content to storage
-    storage.save_csv(thread_id, sheet_name, csv_data)
-    
-    # Get metadata
-    metadata = storage.get_metadata(thread_id, sheet_name)
+    if metadata is None:
+        # Save the full fallback CSV content before returning its resource URI, so the
+        # resource can be read as soon as the response arrives
+        _, saved_metadata = await asyncio.to_thread(storage.save_csv, thread_id, sheet_name, csv_data)
+        metadata = saved_metadata
     
-    # Truncate CSV content if it's too large (> 10KB)
-    MAX_SIZE = 10 * 1024  # 10KB
+    # Truncate CSV content if it's too large (> 10KB of UTF-8); XLSX exports only
+    # return their leading rows, which is all the truncation looks at
     truncated_csv, is_truncated = truncate_csv_content(csv_data, MAX_SIZE)
     
     # Update metadata with truncation info
@@ -139,4 +282,4 @@ async def handle_quip_read_spreadsheet(arguments: Dict[str, Any], storage: Stora
     # 2. MCP clients like Claude expect this format for structured data
     # 3. We manually serialize the JSON object to ensure proper formatting
     # If MCP adds native JSON support in the future, this could be changed to type="json"
-    return [TextContent(type="text", text=json.dumps(response_data))]
+    return [TextContent(type="text", text=jsonutil.dumps(response_data))]
@@ -0,0 +1,29 @@
+"""
+Shared fixtures for the unit tests.
+"""
+import pytest
+
+from src.storage import LocalStorage
+
+
+@pytest.fixture(scope="session")
+def quip_tools():
+    """Tool list built once and shared by every test that inspects tool schemas"""
+    from src.tools import get_quip_tools
+    return get_quip_tools()
+
+
+@pytest.fixture(scope="session")
+def populated_local_storage(tmp_path_factory):
+    """
+    LocalStorage holding one saved sheet, shared by tests that only read from it
+
+    Returns:
+        tuple: (storage, thread_id, sheet_name, csv_content, file_path, saved_metadata)
+    """
+    storage = LocalStorage(str(tmp_path_factory.mktemp("storage")), is_file_protocol=False)
+    thread_id = "test_thread_id"
+    sheet_name = "test_sheet"
+    csv_content = "header1,header2\nvalue1,value2\nvalue3,value4"
+    file_path, saved_metadata = storage.save_csv(thread_id, sheet_name, csv_content)
+    return storage, thread_id, sheet_name, csv_content, file_path, saved_metadata
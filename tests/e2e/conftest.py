@@ -2,7 +2,7 @@ import os
 import pytest
 import tempfile
 from dotenv import load_dotenv
-from src.quip_client import QuipClient
+from src.quip_client import QuipClient, convert_xlsx_to_csv
 from src.storage import LocalStorage
 @pytest.fixture(scope="session", autouse=True)
 def load_env():
@@ -28,28 +28,76 @@ def load_env():
         pytest.skip("TEST_THREAD_ID environment variable is not set, skipping e2e tests")
         pytest.skip("TEST_THREAD_ID环境变量未设置，跳过e2e测试")
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def quip_client():
     """Create a QuipClient instance"""
     token = os.environ.get("QUIP_TOKEN")
     base_url = os.environ.get("QUIP_BASE_URL", "https://platform.quip.com")
     return QuipClient(access_token=token, base_url=base_url)
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def test_thread_id():
     """Get the test thread ID"""
     return os.environ.get("TEST_THREAD_ID")
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def test_sheet_name():
     """Get the test sheet name"""
     return os.environ.get("TEST_SHEET_NAME")
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def test_large_sheet_name():
     """Get the test large sheet name"""
     return os.environ.get("TEST_LARGE_SHEET_NAME")
 
+@pytest.fixture(scope="session")
+def exported_xlsx_path(quip_client, test_thread_id, tmp_path_factory):
+    """
+    Export the test thread to XLSX once per test run
+    
+    Under pytest-xdist every worker runs this fixture, so the export is written to the
+    temp directory shared by all workers and guarded by a file lock: the first worker
+    exports it and the others reuse the file.
+    
+    Returns:
+        str: Path to the exported XLSX file
+    """
+    if not os.environ.get("PYTEST_XDIST_WORKER"):
+        xlsx_path = str(tmp_path_factory.mktemp("export") / "export.xlsx")
+        quip_client.export_thread_to_xlsx(test_thread_id, xlsx_path)
+        return xlsx_path
+    
+    from filelock import FileLock
+    
+    shared_dir = tmp_path_factory.getbasetemp().parent
+    xlsx_path = shared_dir / "export.xlsx"
+    done_path = shared_dir / "export.xlsx.done"
+    with FileLock(str(xlsx_path) + ".lock"):
+        if not done_path.is_file():
+            quip_client.export_thread_to_xlsx(test_thread_id, str(xlsx_path))
+            done_path.touch()
+    return str(xlsx_path)
+
+@pytest.fixture(scope="session")
+def csv_data(exported_xlsx_path, test_sheet_name):
+    """Convert the test sheet of the exported XLSX to CSV once per test session"""
+    return convert_xlsx_to_csv(exported_xlsx_path, test_sheet_name)
+
+@pytest.fixture(scope="session")
+def large_csv_data(exported_xlsx_path, test_large_sheet_name):
+    """Convert the large test sheet of the exported XLSX to CSV once per test session"""
+    return convert_xlsx_to_csv(exported_xlsx_path, test_large_sheet_name)
+
+@pytest.fixture
+def xlsx_tmp_path(tmp_path):
+    """
+    Get a path for a per-test XLSX export, cleaned up by pytest's tmp_path
+    
+    Returns:
+        str: Path for the XLSX file
+    """
+    return str(tmp_path / "export.xlsx")
+
 @pytest.fixture
 def temp_storage_path():
     """
@@ -58,7 +106,9 @@ def temp_storage_path():
     Returns:
         str: Path to the temporary directory
     """
-    with tempfile.TemporaryDirectory(prefix="quip_mcp_test_") as temp_dir:
+    # Include the xdist worker in the name so parallel workers never share a directory
+    worker_id = os.environ.get("PYTEST_XDIST_WORKER", "main")
+    with tempfile.TemporaryDirectory(prefix=f"quip_mcp_test_{worker_id}_") as temp_dir:
         yield temp_dir
         # Directory will be automatically cleaned up after the test
 
@@ -0,0 +1,17 @@
+import csv
+from typing import List
+
+
+def first_row(csv_data: str) -> List[str]:
+    """
+    Parse only the first row of CSV content
+    
+    Args:
+        csv_data: CSV content
+        
+    Returns:
+        List[str]: Cell values of the first row
+    """
+    line_end = csv_data.find("\n")
+    first_line = csv_data if line_end == -1 else csv_data[:line_end]
+    return next(csv.reader([first_line]), [])
@@ -0,0 +1,59 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from src.storage import StorageInterface, count_rows
+
+
+class FakeStorage(StorageInterface):
+    """
+    In-memory storage stub that returns canned values and records the calls it receives
+    """
+    def __init__(
+        self,
+        csv_content: Optional[str] = None,
+        metadata: Union[Dict[str, Any], Callable[[str, Optional[str]], Dict[str, Any]], None] = None,
+        resource_uri: Union[str, Callable[[str, Optional[str]], str], None] = None,
+        is_file_protocol: bool = False,
+        storage_path: str = "/tmp/test_storage"
+    ):
+        """
+        Initialize the stub
+
+        Args:
+            csv_content: Content returned by get_csv
+            metadata: Metadata returned by get_metadata, or a function of (thread_id, sheet_name)
+            resource_uri: URI returned by get_resource_uri, or a function of (thread_id, sheet_name)
+            is_file_protocol: Whether the storage pretends to hand out file:// URIs
+            storage_path: Directory reported as the storage location
+        """
+        self.csv_content = csv_content
+        self.metadata = metadata
+        self.resource_uri = resource_uri
+        self.is_file_protocol = is_file_protocol
+        self.storage_path = storage_path
+        self.saved: List[Tuple[str, Optional[str], str]] = []
+        self.csv_reads: List[Tuple[str, Optional[str]]] = []
+        self.metadata_reads: List[Tuple[str, Optional[str]]] = []
+
+    def save_csv(self, thread_id: str, sheet_name: Optional[str], csv_content: str) -> Tuple[str, Dict[str, Any]]:
+        self.saved.append((thread_id, sheet_name, csv_content))
+        file_name = f"{thread_id}-{sheet_name}.csv" if sheet_name else f"{thread_id}.csv"
+        return f"{self.storage_path}/{file_name}", {
+            "total_rows": count_rows(csv_content),
+            "total_size": len(csv_content.encode('utf-8')),
+            "resource_uri": self.get_resource_uri(thread_id, sheet_name)
+        }
+
+    def get_csv(self, thread_id: str, sheet_name: Optional[str] = None) -> Optional[str]:
+        self.csv_reads.append((thread_id, sheet_name))
+        return self.csv_content
+
+    def get_resource_uri(self, thread_id: str, sheet_name: Optional[str] = None) -> str:
+        if callable(self.resource_uri):
+            return self.resource_uri(thread_id, sheet_name)
+        return self.resource_uri
+
+    def get_metadata(self, thread_id: str, sheet_name: Optional[str] = None) -> Dict[str, Any]:
+        self.metadata_reads.append((thread_id, sheet_name))
+        if callable(self.metadata):
+            return self.metadata(thread_id, sheet_name)
+        return dict(self.metadata or {})
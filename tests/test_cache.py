@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for the cache module.
+"""
+from unittest.mock import patch
+
+from src.cache import LRUCache
+
+
+def test_lru_cache_get_and_set():
+    """Test storing and retrieving values"""
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    
+    assert cache.get("a") == 1
+    assert cache.get("missing") is None
+    assert cache.get("missing", "default") == "default"
+
+
+def test_lru_cache_evicts_least_recently_used():
+    """Test that the least recently used entry is evicted when full"""
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    
+    # Touch "a" so that "b" becomes the least recently used entry
+    cache.get("a")
+    cache.set("c", 3)
+    
+    assert len(cache) == 2
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_lru_cache_ttl_expiry():
+    """Test that entries expire after the time-to-live"""
+    cache = LRUCache(maxsize=2, ttl=10)
+    
+    with patch('src.cache.time.monotonic', return_value=100.0):
+        cache.set("a", 1)
+    with patch('src.cache.time.monotonic', return_value=105.0):
+        assert cache.get("a") == 1
+    with patch('src.cache.time.monotonic', return_value=111.0):
+        assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_lru_cache_pop_and_clear():
+    """Test removing entries"""
+    cache = LRUCache()
+    cache.set("a", 1)
+    cache.set("b", 2)
+    
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "gone") == "gone"
+    
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_lru_cache_set_skips_values_read_before_clear():
+    """Test that a value read before the cache was cleared is not stored"""
+    cache = LRUCache()
+    generation = cache.generation
+    cache.set("a", 1, generation)
+    assert cache.get("a") == 1
+    
+    cache.clear()
+    cache.set("b", 2, generation)
+    assert cache.get("b") is None
+    
+    cache.set("b", 2, cache.generation)
+    assert cache.get("b") == 2
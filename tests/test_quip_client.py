@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Tests for the Quip client.
+"""
+import io
+import os
+import tempfile
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+from bs4 import BeautifulSoup
+from openpyxl import Workbook
+
+from src.quip_client import (
+    QuipClient, RangeDownloadError, convert_xlsx_to_csv, create_session, extract_sheet_data, iter_xlsx_csv_lines,
+    parse_content_range
+)
+
+
+def make_client(thread):
+    """Create a QuipClient whose session returns the given thread JSON"""
+    session = MagicMock()
+    session.get.return_value.json.return_value = thread
+    return QuipClient(access_token="fake_token", session=session), session
+
+
+def make_table(rows):
+    """Build a Quip-style HTML table, with a row-number cell leading each row"""
+    html = "".join(
+        "<tr><td>{}</td>{}</tr>".format(index, "".join(f"<td>{cell}</td>" for cell in row))
+        for index, row in enumerate(rows, 1)
+    )
+    return BeautifulSoup(f"<table>{html}</table>", "html.parser").find("table")
+
+
+def test_get_thread_uses_cache():
+    """Test that repeated get_thread calls make a single request"""
+    client, session = make_client({"thread": {"type": "spreadsheet"}, "html": "<table></table>"})
+    
+    assert client.is_spreadsheet("thread1") is True
+    client.get_thread("thread1")
+    
+    session.get.assert_called_once_with("https://platform.quip.com/1/threads/thread1", auth=client.auth)
+
+
+def test_shared_session_is_not_modified():
+    """Test that clients sharing an injected session each send their own token"""
+    session = requests.Session()
+    default_headers = dict(session.headers)
+    first = QuipClient(access_token="first_token", session=session)
+    second = QuipClient(access_token="second_token", session=session)
+    
+    assert dict(session.headers) == default_headers
+    for client, token in ((first, "first_token"), (second, "second_token")):
+        request = session.prepare_request(requests.Request("GET", "https://platform.quip.com/1/threads/t", auth=client.auth))
+        assert request.headers["Authorization"] == f"Bearer {token}"
+        assert request.headers["User-Agent"] == default_headers["User-Agent"]
+
+
+def test_create_session_returns_last_response_after_retries():
+    """Test that exhausted retries leave raise_for_status to report an HTTPError"""
+    retry = create_session().get_adapter("https://platform.quip.com").max_retries
+    
+    assert retry.total == 3
+    assert retry.raise_on_status is False
+
+
+def test_get_thread_refresh_bypasses_cache():
+    """Test that refresh=True fetches the thread again"""
+    client, session = make_client({"thread": {"type": "document"}})
+    
+    client.get_thread("thread1")
+    client.get_thread("thread1", refresh=True)
+    
+    assert session.get.call_count == 2
+
+
+def test_iter_xlsx_csv_lines_matches_convert_xlsx_to_csv():
+    """Test that streamed CSV lines join to the same output as convert_xlsx_to_csv"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        xlsx_path = os.path.join(temp_dir, "test.xlsx")
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws.append(["name", "note"])
+        ws.append(["a", "contains, comma"])
+        ws.append([1, None])
+        wb.save(xlsx_path)
+        
+        lines = list(iter_xlsx_csv_lines(xlsx_path, "data"))
+        assert len(lines) == 3
+        assert "".join(lines) == convert_xlsx_to_csv(xlsx_path, "Data")
+
+
+def test_is_spreadsheet_cached_until_cleared():
+    """Test that spreadsheet checks are cached per thread until clear_cache is called"""
+    client, session = make_client({"thread": {"type": "document"}, "html": ""})
+    
+    assert client.is_spreadsheet("thread1") is False
+    client.thread_cache.clear()
+    assert client.is_spreadsheet("thread1") is False
+    session.get.assert_called_once()
+    
+    client.clear_cache()
+    assert client.is_spreadsheet("thread1") is False
+    assert session.get.call_count == 2
+
+
+def test_is_spreadsheet_does_not_cache_errors():
+    """Test that failed lookups are not cached"""
+    client, session = make_client({"thread": {"type": "spreadsheet"}, "html": ""})
+    session.get.return_value.raise_for_status.side_effect = [Exception("unavailable"), None]
+    
+    assert client.is_spreadsheet("thread1") is False
+    assert client.is_spreadsheet("thread1") is True
+
+
+class RangeSession:
+    """Fake session serving a body, honoring Range/If-Range headers like an HTTP server"""
+    def __init__(self, body, etag='"v1"', honor_ranges=True, max_part_size=None):
+        self.body = body
+        self.etag = etag
+        self.honor_ranges = honor_ranges
+        self.max_part_size = max_part_size
+        self.requests = []
+
+    def get(self, url, headers=None, auth=None, stream=False):
+        headers = headers or {}
+        self.requests.append(headers)
+        response = MagicMock()
+        response.headers = {"ETag": self.etag} if self.etag else {}
+        if self.honor_ranges:
+            response.headers["Accept-Ranges"] = "bytes"
+        byte_range = headers.get("Range")
+        if_range = headers.get("If-Range")
+        if byte_range and self.honor_ranges and (if_range is None or if_range == self.etag):
+            start, end = (int(value) for value in byte_range[len("bytes="):].split("-"))
+            end = min(end, len(self.body) - 1)
+            if self.max_part_size:
+                # Servers may answer with less than was asked for
+                end = min(end, start + self.max_part_size - 1)
+            response.status_code = 206
+            response.headers["Content-Range"] = f"bytes {start}-{end}/{len(self.body)}"
+            response.raw = io.BytesIO(self.body[start:end + 1])
+        else:
+            response.status_code = 200
+            response.headers["Content-Length"] = str(len(self.body))
+            response.raw = io.BytesIO(self.body)
+        return response
+
+
+@pytest.fixture
+def small_range_parts(monkeypatch):
+    """Shrink the range part size so small bodies are split into several ranges"""
+    monkeypatch.setattr("src.quip_client.RANGE_PART_MIN_SIZE", 4)
+
+
+@pytest.mark.parametrize("content_range,expected", [
+    ("bytes 0-99/12345", (0, 99, 12345)),
+    ("bytes 4-7/*", (4, 7, None)),
+    ("bytes */12345", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_content_range(content_range, expected):
+    """Test parsing Content-Range headers"""
+    assert parse_content_range(content_range) == expected
+
+
+@pytest.mark.parametrize("body,etag,honor_ranges,expected_ranges", [
+    (b"abc", '"v1"', True, [""]),                                   # fits in the first part
+    (b"0123456789a", '"v1"', True, ["", "bytes=4-7", "bytes=8-10"]),  # rest split into ranges
+    (b"0123456789a", '"v1"', False, [""]),                          # ranges not accepted
+    (b"0123456789a", None, True, [""]),                             # no validator
+])
+def test_export_thread_to_xlsx_downloads(tmp_path, small_range_parts, body, etag, honor_ranges, expected_ranges):
+    """Test that exports are read from one response unless they can be fetched in validated ranges"""
+    session = RangeSession(body, etag=etag, honor_ranges=honor_ranges)
+    client = QuipClient(access_token="fake_token", session=session)
+    output_path = str(tmp_path / "export.xlsx")
+    
+    client.export_thread_to_xlsx("thread1", output_path)
+    
+    with open(output_path, "rb") as f:
+        assert f.read() == body
+    assert sorted(request.get("Range", "") for request in session.requests) == sorted(expected_ranges)
+    # Every range must be tied to the version seen in the first response
+    assert all(request.get("If-Range") == etag for request in session.requests if request.get("Range"))
+
+
+def test_download_ranges_rejects_full_response(tmp_path, small_range_parts):
+    """Test that a range answered with the full body raises instead of corrupting the file"""
+    session = RangeSession(b"0123456789a", etag='"v2"')
+    client = QuipClient(access_token="fake_token", session=session)
+    output_path = tmp_path / "export.xlsx"
+    output_path.write_bytes(b"0123" + b"\0" * 7)
+    
+    # The validator no longer matches, so the server sends the whole new version
+    with pytest.raises(RangeDownloadError):
+        client._download_ranges("https://example.com/export", str(output_path), 4, 11, '"v1"', 4)
+
+
+def test_download_ranges_rejects_short_partial_response(tmp_path, small_range_parts):
+    """Test that a partial response covering less than the requested range raises"""
+    session = RangeSession(b"0123456789a", max_part_size=2)
+    client = QuipClient(access_token="fake_token", session=session)
+    output_path = tmp_path / "export.xlsx"
+    output_path.write_bytes(b"0123" + b"\0" * 7)
+    
+    with pytest.raises(RangeDownloadError):
+        client._download_ranges("https://example.com/export", str(output_path), 4, 11, '"v1"', 4)
+
+
+def test_export_thread_to_xlsx_falls_back_when_file_changes(tmp_path, small_range_parts):
+    """Test that a changed export during a range download is downloaded again sequentially"""
+    first_version = b"0123456789a"
+    second_version = b"ABCDEFGHIJK"
+    session = RangeSession(first_version, etag='"v1"')
+    original_get = session.get
+    
+    def get(url, headers=None, auth=None, stream=False):
+        response = original_get(url, headers, auth, stream)
+        # The export is regenerated right after the first response
+        session.body, session.etag = second_version, '"v2"'
+        return response
+    
+    session.get = get
+    client = QuipClient(access_token="fake_token", session=session)
+    output_path = str(tmp_path / "export.xlsx")
+    
+    client.export_thread_to_xlsx("thread1", output_path)
+    
+    with open(output_path, "rb") as f:
+        assert f.read() == second_version
+
+
+@pytest.mark.parametrize("rows,expected", [
+    (
+        # Leading metadata is kept ahead of the header
+        [["Updated on 2024-01-01", ""], ["Name", "Status"], ["Alpha", "Done"], ["Beta", "Open"]],
+        [["Updated on 2024-01-01"], ["Name", "Status"], ["Alpha", "Done"], ["Beta", "Open"]]
+    ),
+    (
+        # Without a header row every non-metadata row is data
+        [["Report"], ["Fix the parser. Soon", "Call the team. Later"], ["Ship it. Now", "Review. Then"]],
+        [["Report"], ["Fix the parser. Soon", "Call the team. Later"], ["Ship it. Now", "Review. Then"]]
+    ),
+    (
+        # Rows between the metadata and the header are dropped
+        [["Created on Monday"], ["Some notes. Here", "More notes. There"], ["Name", "Status"], ["Alpha", "Done"]],
+        [["Created on Monday"], ["Name", "Status"], ["Alpha", "Done"]]
+    ),
+    (
+        # Metadata-like and zero-width rows after the header are skipped
+        [["Name", "Status"], ["Alpha", "Done"], ["Total", "\u200b"], ["Beta", "Open\u200b"]],
+        [["Name", "Status"], ["Alpha", "Done"], ["Beta", "Open"]]
+    ),
+    (
+        # Consecutive a)b)c) items in the Feature to Address column are split onto lines
+        [["Name", "Feature to Address"], ["Alpha", "a)Login b)Logout c)Reset"], ["Beta", "a)b)c)"], ["Gamma", "a)x c)y"]],
+        [["Name", "Feature to Address"], ["Alpha", "a)Login b)Logout c)Reset"], ["Beta", "a)\nb)\nc)"], ["Gamma", "a)x c)y"]]
+    ),
+    ([], []),
+])
+def test_extract_sheet_data(rows, expected):
+    """Test classifying sheet rows as metadata, header and data"""
+    assert extract_sheet_data(make_table(rows)) == expected
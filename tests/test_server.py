@@ -3,150 +3,274 @@
 Tests for the Quip MCP server.
 """
 import os
-import sys
+import stat
+import asyncio
 import pytest
 import json
 import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock
 
-# Add the parent directory to the path so we can import the src module
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
-from src.server import main, async_main, parse_arguments, get_storage_path, configure_logging
+from src.server import main, async_main, parse_arguments, get_storage_path, configure_logging, resource_cache, access_resource, discover_resources, logger
 from src.quip_client import QuipClient
-from src.tools import get_quip_tools, handle_quip_read_spreadsheet
+from src.tools import get_quip_tools, get_quip_client, handle_quip_read_spreadsheet, inflight_exports, get_temp_xlsx_path, export_sheet_via_xlsx, MAX_SIZE
 from src.storage import LocalStorage
+from tests.helpers import FakeStorage
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Make sure cached resource content, Quip clients and in-flight exports do not leak between tests"""
+    resource_cache.clear()
+    get_quip_client.cache_clear()
+    inflight_exports.clear()
+    yield
+    resource_cache.clear()
+    get_quip_client.cache_clear()
+    inflight_exports.clear()
+
+
+@pytest.fixture
+def quip_env(monkeypatch):
+    """Set QUIP_TOKEN and replace QuipClient in the tools module with a preconfigured mock"""
+    monkeypatch.setenv("QUIP_TOKEN", "fake_token")
+    monkeypatch.delenv("QUIP_BASE_URL", raising=False)
+    with patch('src.tools.QuipClient') as mock_client:
+        mock_instance = MagicMock()
+        mock_client.return_value = mock_instance
+        mock_instance.is_spreadsheet.return_value = True
+        mock_instance.export_thread_to_xlsx.return_value = None
+        yield mock_client, mock_instance
+
+
+@pytest.fixture
+def fake_storage():
+    """Storage stub that hands out quip:// resource URIs"""
+    return FakeStorage(resource_uri="quip://test_thread_id?sheet=test_sheet")
+
+
+def patch_xlsx_lines(csv_content):
+    """Patch the XLSX conversion in the tools module to yield the lines of the given CSV content"""
+    return patch('src.tools.iter_xlsx_csv_lines', side_effect=lambda path, sheet_name: iter(csv_content.splitlines(keepends=True)))
+
+
+def make_dir_entries(directory, filenames):
+    """Build a mock os.scandir context manager yielding entries for the given filenames"""
+    entries = []
+    for filename in filenames:
+        entry = MagicMock(path=f"{directory}/{filename}")
+        entry.name = filename
+        entries.append(entry)
+    scandir_context = MagicMock()
+    scandir_context.__enter__.return_value = iter(entries)
+    return scandir_context
+
+
+def test_get_quip_tools(quip_tools):
+    """Test that get_quip_tools returns a list of tools"""
+    assert len(quip_tools) > 0
+    assert any(tool.name == "quip_read_spreadsheet" for tool in quip_tools)
+    
+    # The tool list is built once and reused
+    assert get_quip_tools() is quip_tools
 
 
-def test_get_quip_tools():
-    """Test that get_quip_tools returns a list of tools"""
-    tools = get_quip_tools()
-    assert len(tools) > 0
-    assert any(tool.name == "quip_read_spreadsheet" for tool in tools)
+def test_get_temp_xlsx_path_reused_per_thread():
+    """Test that the temporary XLSX path is stable within a thread and distinct across threads"""
+    path = get_temp_xlsx_path()
+    assert path == get_temp_xlsx_path()
+    assert path.endswith(".xlsx")
+    
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        other_path = executor.submit(get_temp_xlsx_path).result()
+    assert other_path != path
+    
+    # Exports live in a directory only this user can access
+    temp_dir = os.path.dirname(path)
+    assert temp_dir != tempfile.gettempdir()
+    assert stat.S_IMODE(os.stat(temp_dir).st_mode) == 0o700
 
 
-@patch('src.tools.QuipClient')
-@pytest.mark.asyncio
-async def test_handle_quip_read_spreadsheet_missing_thread_id(mock_quip_client):
-    """Test that handle_quip_read_spreadsheet raises an error when threadId is missing"""
-    # Create a mock storage
-    mock_storage = MagicMock()
+def test_export_sheet_via_xlsx_overwrites_thread_export(fake_storage):
+    """Test that each export in a thread replaces the previous one at the same path"""
+    client = MagicMock()
+    exports = iter([b"first export", b"second"])
+    
+    def export_thread_to_xlsx(thread_id, path):
+        with open(path, "wb") as f:
+            f.write(next(exports))
+    
+    client.export_thread_to_xlsx.side_effect = export_thread_to_xlsx
     
+    with patch_xlsx_lines("header1\nvalue1") as mock_lines:
+        export_sheet_via_xlsx(client, fake_storage, "test_thread_id", None)
+        export_sheet_via_xlsx(client, fake_storage, "test_thread_id", None)
+    
+    paths = {call.args[0] for call in mock_lines.call_args_list}
+    assert paths == {get_temp_xlsx_path()}
+    with open(get_temp_xlsx_path(), "rb") as f:
+        assert f.read() == b"second"
+
+
+def test_export_sheet_via_xlsx_streams_rows_into_storage(fake_storage):
+    """Test that the whole sheet is saved while only its leading rows are returned"""
+    csv_content = "\n".join(["header1,header2"] + ["value1,value2"] * 2000) + "\n"
+    
+    with patch_xlsx_lines(csv_content):
+        prefix, metadata = export_sheet_via_xlsx(MagicMock(), fake_storage, "test_thread_id", "test_sheet")
+    
+    assert fake_storage.saved == [("test_thread_id", "test_sheet", csv_content)]
+    assert metadata["total_rows"] == 2001
+    assert MAX_SIZE < len(prefix) < len(csv_content)
+    assert csv_content.startswith(prefix)
+
+
+def test_export_sheet_via_xlsx_does_not_save_empty_sheet(fake_storage):
+    """Test that an empty sheet leaves the stored copy alone"""
+    with patch_xlsx_lines(""):
+        assert export_sheet_via_xlsx(MagicMock(), fake_storage, "test_thread_id", "test_sheet") == ("", None)
+    assert fake_storage.saved == []
+
+
+async def test_handle_quip_read_spreadsheet_missing_thread_id(quip_env, fake_storage):
+    """Test that handle_quip_read_spreadsheet raises an error when threadId is missing"""
     with pytest.raises(ValueError, match="threadId is required"):
-        await handle_quip_read_spreadsheet({}, mock_storage)
+        await handle_quip_read_spreadsheet({}, fake_storage)
 
 
-@patch('src.tools.QuipClient')
-@patch('os.environ.get')
-@pytest.mark.asyncio
-async def test_handle_quip_read_spreadsheet_not_spreadsheet(mock_environ_get, mock_quip_client):
+async def test_handle_quip_read_spreadsheet_not_spreadsheet(quip_env, fake_storage):
     """Test that handle_quip_read_spreadsheet raises an error when thread is not a spreadsheet"""
-    # Setup mocks
-    mock_environ_get.return_value = "fake_token"  # Mock QUIP_TOKEN
-    
-    mock_instance = MagicMock()
-    mock_quip_client.return_value = mock_instance
+    _, mock_instance = quip_env
     mock_instance.is_spreadsheet.return_value = False
     
-    # Test
     with pytest.raises(ValueError, match="Thread .* is not a spreadsheet"):
-        # Create a mock storage
-        mock_storage = MagicMock()
-        await handle_quip_read_spreadsheet({"threadId": "test_thread_id"}, mock_storage)
-@patch('src.tools.QuipClient')
-@patch('os.environ.get')
-@pytest.mark.asyncio
-async def test_handle_quip_read_spreadsheet_resource_uri_quip_protocol(mock_environ_get, mock_quip_client):
-    """Test that handle_quip_read_spreadsheet returns resource_uri with quip:// protocol when is_file_protocol=False"""
-    # Setup mocks
-    mock_environ_get.return_value = "fake_token"  # Mock QUIP_TOKEN
-    
-    mock_instance = MagicMock()
-    mock_quip_client.return_value = mock_instance
-    mock_instance.is_spreadsheet.return_value = True
-    
-    # Mock export methods
-    mock_instance.export_thread_to_xlsx.return_value = None
-    
-    # Mock convert_xlsx_to_csv
-    with patch('src.tools.convert_xlsx_to_csv', return_value="header1,header2\nvalue1,value2"):
-        # Create a mock storage with is_file_protocol=False
-        mock_storage = MagicMock()
-        mock_storage.get_metadata.return_value = {
-            "total_rows": 2,
-            "total_size": 30,
-            "resource_uri": "quip://test_thread_id?sheet=test_sheet"
-        }
-        mock_storage.get_resource_uri.return_value = "quip://test_thread_id?sheet=test_sheet"
-        mock_storage.is_file_protocol = False
+        await handle_quip_read_spreadsheet({"threadId": "test_thread_id"}, fake_storage)
+
+
+@pytest.mark.parametrize("is_file_protocol,resource_uri,uri_prefix,extra_check", [
+    (False, "quip://test_thread_id?sheet=test_sheet", "quip://", "test_sheet"),
+    (True, "file:///tmp/test_storage/test_thread_id-test_sheet.csv", "file://", "test_thread_id-test_sheet.csv"),
+])
+async def test_handle_quip_read_spreadsheet_resource_uri(quip_env, is_file_protocol, resource_uri, uri_prefix, extra_check):
+    """Test that handle_quip_read_spreadsheet returns resource_uri matching the storage protocol"""
+    # Mock the XLSX conversion
+    with patch_xlsx_lines("header1,header2\nvalue1,value2"):
+        storage = FakeStorage(resource_uri=resource_uri, is_file_protocol=is_file_protocol)
         
         # Call the function
-        result = await handle_quip_read_spreadsheet({"threadId": "test_thread_id", "sheetName": "test_sheet"}, mock_storage)
+        result = await handle_quip_read_spreadsheet({"threadId": "test_thread_id", "sheetName": "test_sheet"}, storage)
         
         # Parse the JSON response
         response_data = json.loads(result[0].text)
         
-        # Verify the resource_uri uses quip:// protocol
+        # Verify the resource_uri uses the expected protocol
         assert "resource_uri" in response_data["metadata"]
-        assert response_data["metadata"]["resource_uri"].startswith("quip://")
+        assert response_data["metadata"]["resource_uri"].startswith(uri_prefix)
         assert "test_thread_id" in response_data["metadata"]["resource_uri"]
-        assert "test_sheet" in response_data["metadata"]["resource_uri"]
+        assert extra_check in response_data["metadata"]["resource_uri"]
 
 
-@patch('src.tools.QuipClient')
-@patch('os.environ.get')
-@pytest.mark.asyncio
-async def test_handle_quip_read_spreadsheet_resource_uri_file_protocol(mock_environ_get, mock_quip_client):
-    """Test that handle_quip_read_spreadsheet returns resource_uri with file:// protocol when is_file_protocol=True"""
-    # Setup mocks
-    mock_environ_get.return_value = "fake_token"  # Mock QUIP_TOKEN
-    
-    mock_instance = MagicMock()
-    mock_quip_client.return_value = mock_instance
-    mock_instance.is_spreadsheet.return_value = True
-    
-    # Mock export methods
-    mock_instance.export_thread_to_xlsx.return_value = None
-    
-    # Mock convert_xlsx_to_csv
-    with patch('src.tools.convert_xlsx_to_csv', return_value="header1,header2\nvalue1,value2"):
-        # Create a mock storage with is_file_protocol=True
-        mock_storage = MagicMock()
-        mock_storage.get_metadata.return_value = {
+async def test_handle_quip_read_spreadsheet_small_csv_saved_before_response(quip_env, fake_storage):
+    """Test that small CSV content is returned in full and already saved when the response arrives"""
+    csv_content = "header1,header2\nvalue1,value2"
+    with patch_xlsx_lines(csv_content):
+        result = await handle_quip_read_spreadsheet({"threadId": "test_thread_id", "sheetName": "test_sheet"}, fake_storage)
+        response_data = json.loads(result[0].text)
+        
+        assert response_data["csv_content"] == csv_content
+        assert response_data["metadata"] == {
             "total_rows": 2,
-            "total_size": 30,
-            "resource_uri": "file:///tmp/test_storage/test_thread_id-test_sheet.csv"
+            "total_size": len(csv_content),
+            "resource_uri": "quip://test_thread_id?sheet=test_sheet",
+            "is_truncated": False
         }
-        mock_storage.get_resource_uri.return_value = "file:///tmp/test_storage/test_thread_id-test_sheet.csv"
-        mock_storage.is_file_protocol = True
-        
-        # Call the function
-        result = await handle_quip_read_spreadsheet({"threadId": "test_thread_id", "sheetName": "test_sheet"}, mock_storage)
+        assert fake_storage.saved == [("test_thread_id", "test_sheet", csv_content)]
+
+
+@pytest.mark.parametrize("header,data_row", [
+    ("header1,header2", "value1,value2"),
+    # Fewer than MAX_SIZE characters, but more than MAX_SIZE bytes of UTF-8
+    ("名称,数量", "苹果,香蕉"),
+])
+async def test_handle_quip_read_spreadsheet_large_csv_truncated(quip_env, fake_storage, header, data_row):
+    """Test that CSV content over MAX_SIZE bytes is saved before responding and returned truncated"""
+    csv_content = "\n".join([header] + [data_row] * 1000)
+    assert len(csv_content.encode("utf-8")) > MAX_SIZE
+    with patch_xlsx_lines(csv_content):
+        result = await handle_quip_read_spreadsheet({"threadId": "test_thread_id", "sheetName": "test_sheet"}, fake_storage)
+    response_data = json.loads(result[0].text)
+    
+    # Saved synchronously, with the metadata describing the full content
+    assert fake_storage.saved == [("test_thread_id", "test_sheet", csv_content)]
+    assert response_data["metadata"] == {
+        "total_rows": 1001,
+        "total_size": len(csv_content.encode("utf-8")),
+        "resource_uri": "quip://test_thread_id?sheet=test_sheet",
+        "is_truncated": True
+    }
+    assert len(response_data["csv_content"].encode("utf-8")) <= MAX_SIZE
+    assert csv_content.startswith(response_data["csv_content"] + "\n")
+
+
+async def test_handle_quip_read_spreadsheet_deduplicates_concurrent_exports(quip_env, fake_storage):
+    """Test that concurrent requests for the same sheet share a single export"""
+    _, mock_instance = quip_env
+    
+    with patch_xlsx_lines("header1,header2\nvalue1,value2") as mock_lines:
+        arguments = {"threadId": "test_thread_id", "sheetName": "test_sheet"}
+        first, second = await asyncio.gather(
+            handle_quip_read_spreadsheet(arguments, fake_storage),
+            handle_quip_read_spreadsheet(arguments, fake_storage)
+        )
         
-        # Parse the JSON response
-        response_data = json.loads(result[0].text)
+        assert first[0].text == second[0].text
+        mock_instance.export_thread_to_xlsx.assert_called_once()
+        mock_lines.assert_called_once()
         
-        # Verify the resource_uri uses file:// protocol
-        assert "resource_uri" in response_data["metadata"]
-        assert response_data["metadata"]["resource_uri"].startswith("file://")
-        assert "test_thread_id-test_sheet.csv" in response_data["metadata"]["resource_uri"]
+        # Once finished, a new request runs its own export
+        await handle_quip_read_spreadsheet(arguments, fake_storage)
+        assert mock_instance.export_thread_to_xlsx.call_count == 2
 
 
+async def test_handle_quip_read_spreadsheet_cancelling_one_request_spares_the_others(quip_env, fake_storage):
+    """Test that cancelling the request that started an export does not fail requests waiting on it"""
+    _, mock_instance = quip_env
+    export_started = threading.Event()
+    release_export = threading.Event()
+    
+    def is_spreadsheet(thread_id):
+        export_started.set()
+        release_export.wait(timeout=5)
+        return True
+    
+    mock_instance.is_spreadsheet.side_effect = is_spreadsheet
+    
+    with patch_xlsx_lines("header1,header2\nvalue1,value2"):
+        arguments = {"threadId": "test_thread_id", "sheetName": "test_sheet"}
+        owner = asyncio.create_task(handle_quip_read_spreadsheet(arguments, fake_storage))
+        await asyncio.to_thread(export_started.wait, 5)
+        waiter = asyncio.create_task(handle_quip_read_spreadsheet(arguments, fake_storage))
+        await asyncio.sleep(0)
+        
+        owner.cancel()
+        release_export.set()
+        
+        result = await waiter
+        assert json.loads(result[0].text)["csv_content"] == "header1,header2\nvalue1,value2"
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        mock_instance.export_thread_to_xlsx.assert_called_once()
+
 
 @patch('argparse.ArgumentParser.parse_args')
 @patch('src.server.logger')
 @patch('src.server.configure_logging')
 @patch('asyncio.run')
-@patch('os.environ.get')
-def test_main_missing_token(mock_environ_get, mock_asyncio_run, mock_configure_logging, mock_logger, mock_parse_args):
+def test_main_missing_token(mock_asyncio_run, mock_configure_logging, mock_logger, mock_parse_args, monkeypatch):
     """Test that main raises an error when QUIP_TOKEN is missing"""
-    # Configure the mock to return None for QUIP_TOKEN and something else for other calls
-    def mock_get(key, default=None):
-        if key == "QUIP_TOKEN":
-            return None
-        return default
-    
-    mock_environ_get.side_effect = mock_get
+    monkeypatch.delenv("QUIP_TOKEN", raising=False)
     
     # Mock logger
     mock_logger.error = MagicMock()
@@ -170,372 +294,234 @@ def test_main_missing_token(mock_environ_get, mock_asyncio_run, mock_configure_l
         mock_asyncio_run.assert_not_called()
 
 
-def test_parse_arguments():
+@pytest.mark.parametrize("argv,expected_storage_path,expected_debug,expected_file_protocol", [
+    (['quip-mcp-server'], None, False, False),
+    (['quip-mcp-server', '--storage-path', '/tmp/test'], '/tmp/test', False, False),
+    (['quip-mcp-server', '--debug'], None, True, False),
+    (['quip-mcp-server', '--file-protocol'], None, False, True),
+    (['quip-mcp-server', '--storage-path', '/tmp/test', '--debug', '--file-protocol'], '/tmp/test', True, True),
+])
+def test_parse_arguments(argv, expected_storage_path, expected_debug, expected_file_protocol):
     """Test parsing command line arguments"""
-    # Test with no arguments
-    with patch('sys.argv', ['quip-mcp-server']):
+    with patch('sys.argv', argv):
         args = parse_arguments()
-        assert args.storage_path is None
-        assert args.debug is False
-        assert args.file_protocol is False
-    
-    # Test with storage-path argument
-    with patch('sys.argv', ['quip-mcp-server', '--storage-path', '/tmp/test']):
-        args = parse_arguments()
-        assert args.storage_path == '/tmp/test'
-        assert args.debug is False
-        assert args.file_protocol is False
-    
-    # Test with debug argument
-    with patch('sys.argv', ['quip-mcp-server', '--debug']):
-        args = parse_arguments()
-        assert args.storage_path is None
-        assert args.debug is True
-        assert args.file_protocol is False
-    
-    # Test with file-protocol argument
-    with patch('sys.argv', ['quip-mcp-server', '--file-protocol']):
-        args = parse_arguments()
-        assert args.storage_path is None
-        assert args.debug is False
-        assert args.file_protocol is True
-    
-    # Test with all arguments
-    with patch('sys.argv', ['quip-mcp-server', '--storage-path', '/tmp/test', '--debug', '--file-protocol']):
-        args = parse_arguments()
-        assert args.storage_path == '/tmp/test'
-        assert args.debug is True
-        assert args.file_protocol is True
-
-
-def test_get_storage_path():
-    """Test getting storage path from arguments or environment"""
-    # Test with argument
-    args = MagicMock()
-    args.storage_path = '/tmp/test'
-    assert get_storage_path(args) == '/tmp/test'
+        assert args.storage_path == expected_storage_path
+        assert args.debug is expected_debug
+        assert args.file_protocol is expected_file_protocol
+
+
+@pytest.mark.parametrize("arg_path,env_path,expected", [
+    ('/tmp/test', None, '/tmp/test'),
+    ('/tmp/test', '/tmp/env', '/tmp/test'),  # argument takes precedence
+    (None, '/tmp/env', '/tmp/env'),
+    (None, None, '/home/user/.quip-mcp-server/storage'),
+])
+def test_get_storage_path(monkeypatch, arg_path, env_path, expected):
+    """Test getting storage path from arguments, environment or the default location"""
+    args = MagicMock(storage_path=arg_path)
+    if env_path is None:
+        monkeypatch.delenv("QUIP_STORAGE_PATH", raising=False)
+    else:
+        monkeypatch.setenv("QUIP_STORAGE_PATH", env_path)
+    
+    with patch('os.path.expanduser', return_value='/home/user'):
+        assert get_storage_path(args) == expected
+
+
+@pytest.mark.parametrize("arg_debug,env_val,expected_level", [
+    (False, None, logging.WARN),
+    (False, "1", logging.DEBUG),
+    (True, None, logging.DEBUG),
+    (True, "1", logging.DEBUG),
+])
 @patch('logging.basicConfig')
-def test_configure_logging_default(mock_basicConfig):
-    """Test configure_logging with default settings"""
-    # Test with no arguments
-    args = MagicMock(debug=False)
-    
-    with patch('os.environ.get', return_value=None):
-        logger = configure_logging(args)
-        
-        # Verify that basicConfig was called with WARN level
-        mock_basicConfig.assert_called_once()
-        assert mock_basicConfig.call_args[1]['level'] == logging.WARN
-
-
-@patch('logging.basicConfig')
-def test_configure_logging_env_debug(mock_basicConfig):
-    """Test configure_logging with debug environment variable"""
-    # Test with debug environment variable
-    args = MagicMock(debug=False)
-    
-    with patch('os.environ.get', return_value="1"):
-        logger = configure_logging(args)
-        
-        # Verify that basicConfig was called with DEBUG level
-        mock_basicConfig.assert_called_once()
-        assert mock_basicConfig.call_args[1]['level'] == logging.DEBUG
-
-
-@patch('logging.basicConfig')
-def test_configure_logging_arg_debug(mock_basicConfig):
-    """Test configure_logging with debug command line argument"""
-    # Test with debug command line argument
-    args = MagicMock(debug=True)
-    
-    with patch('os.environ.get', return_value=None):
-        logger = configure_logging(args)
-        
-        # Verify that basicConfig was called with DEBUG level
-        mock_basicConfig.assert_called_once()
-        assert mock_basicConfig.call_args[1]['level'] == logging.DEBUG
-
-
-@patch('logging.basicConfig')
-def test_configure_logging_both_debug(mock_basicConfig):
-    """Test configure_logging with both debug environment variable and command line argument"""
-    # Test with both debug environment variable and command line argument
-    args = MagicMock(debug=True)
-    
-    with patch('os.environ.get', return_value="1"):
-        logger = configure_logging(args)
-        
-        # Verify that basicConfig was called with DEBUG level
-        mock_basicConfig.assert_called_once()
-        assert mock_basicConfig.call_args[1]['level'] == logging.DEBUG
-
-    
-    # Test with environment variable
-    args = MagicMock()
-    args.storage_path = None
-    with patch('os.environ.get', return_value='/tmp/env'):
-        assert get_storage_path(args) == '/tmp/env'
-    
-    # Test with default
-    args = MagicMock()
-    args.storage_path = None
-    with patch('os.environ.get', return_value=None):
-        with patch('os.path.expanduser', return_value='/home/user'):
-            path = get_storage_path(args)
-            assert path == '/home/user/.quip-mcp-server/storage'
-
-
-@patch('src.server.urlparse')
-@patch('src.server.parse_qs')
-@pytest.mark.asyncio
-async def test_access_resource_quip_protocol(mock_parse_qs, mock_urlparse):
-    """Test accessing a resource with quip:// protocol"""
-    # Import the access_resource function
-    from src.server import access_resource
-    
-    # Setup mocks
-    mock_urlparse.return_value = MagicMock(scheme="quip", netloc="test_thread_id")
-    mock_parse_qs.return_value = {"sheet": ["test_sheet"]}
-    
-    # Create a mock storage
-    mock_storage = MagicMock()
-    mock_storage.get_csv.return_value = "header1,header2\nvalue1,value2"
+def test_configure_logging(mock_basicConfig, arg_debug, env_val, expected_level, monkeypatch):
+    """Test configure_logging with the debug argument and environment variable combinations"""
+    args = MagicMock(debug=arg_debug)
+    if env_val is None:
+        monkeypatch.delenv("QUIP_DEBUG", raising=False)
+    else:
+        monkeypatch.setenv("QUIP_DEBUG", env_val)
+    
+    configure_logging(args)
+    
+    # Verify that basicConfig was called with the expected level
+    mock_basicConfig.assert_called_once()
+    assert mock_basicConfig.call_args[1]['level'] == expected_level
+
+
+@pytest.mark.parametrize("uri,csv_return,expected_get_csv_args,raises_match", [
+    (
+        "quip://test_thread_id?sheet=test_sheet",
+        "header1,header2\nvalue1,value2",
+        ("test_thread_id", "test_sheet"),
+        None
+    ),
+    (
+        "file:///tmp/test_storage/thread1-sheet1.csv",
+        "header1,header2\nvalue1,value2",
+        ("thread1", "sheet1"),
+        None
+    ),
+    (
+        "quip://test_thread_id?sheet=test_sheet",
+        None,
+        ("test_thread_id", "test_sheet"),
+        "Resource not found"
+    ),
+    (
+        "invalid://test_thread_id",
+        None,
+        None,
+        "Unsupported URI scheme"
+    ),
+])
+async def test_access_resource(uri, csv_return, expected_get_csv_args, raises_match):
+    """Test accessing resources by URI scheme, including unsupported schemes and missing content"""
+    # Create a storage stub
+    storage = FakeStorage(csv_content=csv_return)
     
     # Patch the global storage_instance
-    with patch('src.server.storage_instance', mock_storage):
-        result = await access_resource("quip://test_thread_id?sheet=test_sheet")
-        
-        # Verify the result
-        assert len(result) == 1
-        assert result[0].type == "text"
-        assert result[0].text == "header1,header2\nvalue1,value2"
-        
-        # Verify the mocks were called correctly
-        mock_urlparse.assert_called_once_with("quip://test_thread_id?sheet=test_sheet")
-        mock_parse_qs.assert_called_once()
-        mock_storage.get_csv.assert_called_once_with("test_thread_id", "test_sheet")
-
-
-@patch('src.server.urlparse')
-@pytest.mark.asyncio
-async def test_access_resource_file_protocol(mock_urlparse):
-    """Test accessing a resource with file:// protocol"""
-    # Import the access_resource function
-    from src.server import access_resource
+    with patch('src.server.storage_instance', storage):
+        if raises_match:
+            with pytest.raises(ValueError, match=raises_match):
+                await access_resource(uri)
+        else:
+            result = await access_resource(uri)
+            
+            # Verify the result
+            assert len(result) == 1
+            assert result[0].type == "text"
+            assert result[0].text == csv_return
+        
+        # Verify the storage was read with the parsed identifiers
+        assert storage.csv_reads == ([expected_get_csv_args] if expected_get_csv_args else [])
+
+
+async def test_access_resource_uses_cache():
+    """Test that repeated resource reads are served from the in-memory cache"""
+    # Create a storage stub
+    storage = FakeStorage(csv_content="header1,header2\nvalue1,value2")
     
+    # Patch the global storage_instance
+    with patch('src.server.storage_instance', storage):
+        first = await access_resource("quip://test_thread_id?sheet=test_sheet")
+        second = await access_resource("quip://test_thread_id?sheet=test_sheet")
+        
+        assert first[0].text == second[0].text == "header1,header2\nvalue1,value2"
+        assert storage.csv_reads == [("test_thread_id", "test_sheet")]
+
+
+async def test_access_resource_does_not_cache_content_replaced_during_read():
+    """Test that content read while a tool call replaces the stored CSV is not cached"""
+    storage = FakeStorage(csv_content="header1,header2\nold1,old2")
+    original_get_csv = storage.get_csv
+    
+    def get_csv(thread_id, sheet_name=None):
+        content = original_get_csv(thread_id, sheet_name)
+        # A tool call saves new content and clears the cache while the old copy is read
+        storage.csv_content = "header1,header2\nnew1,new2"
+        resource_cache.clear()
+        return content
+    
+    storage.get_csv = get_csv
+    with patch('src.server.storage_instance', storage):
+        first = await access_resource("quip://test_thread_id?sheet=test_sheet")
+        storage.get_csv = original_get_csv
+        second = await access_resource("quip://test_thread_id?sheet=test_sheet")
+        
+        assert first[0].text == "header1,header2\nold1,old2"
+        assert second[0].text == "header1,header2\nnew1,new2"
+
+
+@pytest.mark.parametrize("is_file_protocol,filenames,expected", [
+    (
+        False,
+        ["thread1.csv", "thread2-sheet1.csv", "thread3.csv.meta"],
+        [
+            ("quip://thread1", "Quip Thread(Spreadsheet): thread1"),
+            ("quip://thread2?sheet=sheet1", "Quip Thread(Spreadsheet): thread2 (Sheet: sheet1)"),
+        ]
+    ),
+    (
+        True,
+        ["thread1.csv", "thread2-sheet1.csv", "thread3.csv.meta"],
+        [
+            (
+                "file:///tmp/test_storage/thread1.csv",
+                "Quip Thread(Spreadsheet): thread1 You can access the file at: /tmp/test_storage/thread1.csv"
+            ),
+            (
+                "file:///tmp/test_storage/thread2-sheet1.csv",
+                "Quip Thread(Spreadsheet): thread2 (Sheet: sheet1) You can access the file at: /tmp/test_storage/thread2-sheet1.csv"
+            ),
+        ]
+    ),
+    (False, [], []),
+    (True, [], []),
+    # None makes the directory scan fail; discovery logs the error and returns no resources
+    (False, None, []),
+    (True, None, []),
+])
+@patch('os.scandir')
+async def test_discover_resources(mock_scandir, is_file_protocol, filenames, expected):
+    """Test discovering resources from the storage directory for both protocols, empty directories and errors"""
     # Setup mocks
-    mock_urlparse.return_value = MagicMock(
-        scheme="file",
-        path="/tmp/test_storage/thread1-sheet1.csv"
+    if filenames is None:
+        mock_scandir.side_effect = Exception("Test exception")
+    else:
+        mock_scandir.return_value = make_dir_entries("/tmp/test_storage", filenames)
+    
+    # Create a storage stub
+    storage = FakeStorage(
+        metadata=lambda thread_id, sheet_name: {
+            "total_rows": 10,
+            "total_size": 1024,
+            "resource_uri": f"quip://{thread_id}" + (f"?sheet={sheet_name}" if sheet_name else "")
+        },
+        resource_uri=lambda thread_id, sheet_name: f"quip://{thread_id}" + (f"?sheet={sheet_name}" if sheet_name else "")
     )
     
-    # Create a mock storage
-    mock_storage = MagicMock()
-    mock_storage.get_csv.return_value = "header1,header2\nvalue1,value2"
-    
     # Patch the global storage_instance
-    with patch('src.server.storage_instance', mock_storage):
-        result = await access_resource("file:///tmp/test_storage/thread1-sheet1.csv")
+    with patch('src.server.storage_instance', storage):
+        resources = await discover_resources(is_file_protocol)
         
-        # Verify the result
-        assert len(result) == 1
-        assert result[0].type == "text"
-        assert result[0].text == "header1,header2\nvalue1,value2"
+        # Verify the result; only .csv files become resources, not .meta files
+        assert [(str(resource.uri), resource.name) for resource in resources] == expected
+        for resource in resources:
+            assert "10 rows" in resource.description
+            assert "1024 bytes" in resource.description
+            assert resource.mime_type == "text/csv"
         
         # Verify the mocks were called correctly
-        mock_urlparse.assert_called_once_with("file:///tmp/test_storage/thread1-sheet1.csv")
-        mock_storage.get_csv.assert_called_once_with("thread1", "sheet1")
+        mock_scandir.assert_called_once_with("/tmp/test_storage")
+        assert storage.metadata_reads == ([("thread1", None), ("thread2", "sheet1")] if expected else [])
 
 
-@patch('src.server.urlparse')
-@pytest.mark.asyncio
-async def test_access_resource_invalid_scheme(mock_urlparse):
-    """Test accessing a resource with an invalid scheme"""
-    # Import the access_resource function
-    from src.server import access_resource
-    
-    # Setup mocks
-    mock_urlparse.return_value = MagicMock(scheme="invalid", netloc="test_thread_id")
-    
-    # Test
-    with pytest.raises(ValueError, match="Unsupported URI scheme"):
-        await access_resource("invalid://test_thread_id")
-
-
-@patch('src.server.urlparse')
-@patch('src.server.parse_qs')
-@pytest.mark.asyncio
-async def test_access_resource_not_found(mock_parse_qs, mock_urlparse):
-    """Test accessing a non-existent resource"""
-    # Import the access_resource function
-    from src.server import access_resource
-    
-    # Setup mocks
-    mock_urlparse.return_value = MagicMock(scheme="quip", netloc="test_thread_id")
-    mock_parse_qs.return_value = {"sheet": ["test_sheet"]}
-    
-    # Create a mock storage
-    mock_storage = MagicMock()
-    mock_storage.get_csv.return_value = None
-    
-    # Patch the global storage_instance
-    with patch('src.server.storage_instance', mock_storage):
-        with pytest.raises(ValueError, match="Resource not found"):
-            await access_resource("quip://test_thread_id?sheet=test_sheet")
-
-
-@patch('os.listdir')
-@patch('os.path.join')
-@pytest.mark.asyncio
-async def test_discover_resources(mock_path_join, mock_listdir):
-    """Test discovering resources from storage directory with default protocol (quip://)"""
-    # Import the discover_resources function
-    from src.server import discover_resources
-    
-    # Setup mocks
-    mock_listdir.return_value = ["thread1.csv", "thread2-sheet1.csv", "thread3.csv.meta"]
-    mock_path_join.side_effect = lambda *args: "/".join(args)
-    
-    # Create a mock storage
-    mock_storage = MagicMock()
-    mock_storage.storage_path = "/tmp/test_storage"
-    mock_storage.get_metadata.side_effect = lambda thread_id, sheet_name: {
-        "total_rows": 10,
-        "total_size": 1024,
-        "resource_uri": f"quip://{thread_id}" + (f"?sheet={sheet_name}" if sheet_name else "")
-    }
-    mock_storage.get_resource_uri.side_effect = lambda thread_id, sheet_name: \
-        f"quip://{thread_id}" + (f"?sheet={sheet_name}" if sheet_name else "")
-    
-    # Patch the global storage_instance
-    with patch('src.server.storage_instance', mock_storage):
-        resources = await discover_resources(False)  # Explicitly pass False for isFileProtocol
-        
-        # Verify the result
-        assert len(resources) == 2  # Only .csv files, not .meta files
-        
-        # Check first resource (thread1.csv)
-        assert str(resources[0].uri) == "quip://thread1"
-        assert resources[0].name == "Quip Thread(Spreadsheet): thread1"
-        assert "10 rows" in resources[0].description
-        assert "1024 bytes" in resources[0].description
-        assert resources[0].mime_type == "text/csv"
-        
-        # Check second resource (thread2-sheet1.csv)
-        assert str(resources[1].uri) == "quip://thread2?sheet=sheet1"
-        assert resources[1].name == "Quip Thread(Spreadsheet): thread2 (Sheet: sheet1)"
-        assert "10 rows" in resources[1].description
-        assert "1024 bytes" in resources[1].description
-        assert resources[1].mime_type == "text/csv"
-        
-        # Verify the mocks were called correctly
-        mock_listdir.assert_called_once_with("/tmp/test_storage")
-        mock_storage.get_metadata.assert_any_call("thread1", None)
-        mock_storage.get_metadata.assert_any_call("thread2", "sheet1")
-
-
-@patch('os.listdir')
-@patch('os.path.join')
-@pytest.mark.asyncio
-async def test_discover_resources_with_file_protocol(mock_path_join, mock_listdir):
-    """Test discovering resources from storage directory with file:// protocol"""
-    # Import the discover_resources function
-    from src.server import discover_resources
-    
-    # Setup mocks
-    mock_listdir.return_value = ["thread1.csv", "thread2-sheet1.csv", "thread3.csv.meta"]
-    mock_path_join.side_effect = lambda *args: "/".join(args)
-    
-    # Create a mock storage
-    mock_storage = MagicMock()
-    mock_storage.storage_path = "/tmp/test_storage"
-    mock_storage.get_metadata.side_effect = lambda thread_id, sheet_name: {
-        "total_rows": 10,
-        "total_size": 1024
-    }
-    
-    # Patch the global storage_instance
-    with patch('src.server.storage_instance', mock_storage):
-        resources = await discover_resources(True)  # Pass True for isFileProtocol
-        
-        # Verify the result
-        assert len(resources) == 2  # Only .csv files, not .meta files
-        
-        # Check first resource (thread1.csv)
-        assert str(resources[0].uri).startswith("file:///tmp/test_storage/thread1.csv")
-        assert resources[0].name.startswith("Quip Thread(Spreadsheet): thread1")
-        assert "You can access the file at:" in resources[0].name
-        assert "/tmp/test_storage/thread1.csv" in resources[0].name
-        assert "10 rows" in resources[0].description
-        assert "1024 bytes" in resources[0].description
-        assert resources[0].mime_type == "text/csv"
+async def test_discover_resources_uses_index():
+    """Test that discovery takes metadata from the storage index instead of per-file reads"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        storage = LocalStorage(temp_dir, is_file_protocol=False)
+        storage.save_csv("thread1", "sheet1", "header1,header2\nvalue1,value2")
         
-        # Check second resource (thread2-sheet1.csv)
-        assert str(resources[1].uri).startswith("file:///tmp/test_storage/thread2-sheet1.csv")
-        assert resources[1].name.startswith("Quip Thread(Spreadsheet): thread2 (Sheet: sheet1)")
-        assert "You can access the file at:" in resources[1].name
-        assert "/tmp/test_storage/thread2-sheet1.csv" in resources[1].name
-        assert "10 rows" in resources[1].description
-        assert "1024 bytes" in resources[1].description
-        assert resources[1].mime_type == "text/csv"
+        with patch('src.server.storage_instance', storage), \
+                patch.object(storage, 'get_metadata') as mock_get_metadata:
+            resources = await discover_resources(False)
         
-        # Verify the mocks were called correctly
-        mock_listdir.assert_called_once_with("/tmp/test_storage")
-        mock_storage.get_metadata.assert_any_call("thread1", None)
-        mock_storage.get_metadata.assert_any_call("thread2", "sheet1")
-@patch('sys.argv')
-def test_debug_mode_output(mock_argv, caplog):
-    """测试启动时指定 --debug 参数后，日志中有 info/debug level 输出"""
-    import logging
-    from src.server import logger
-    
-    # 设置 caplog 级别为 DEBUG
-    caplog.set_level(logging.DEBUG)
-    
-    # 模拟命令行参数
-    mock_argv.__getitem__.side_effect = lambda idx: ['quip-mcp-server', '--debug'][idx]
-    
-    # 清除之前的日志记录
-    caplog.clear()
-    
-    # 输出不同级别的日志
-    logger.debug("这是一条 DEBUG 消息")
-    logger.info("这是一条 INFO 消息")
-    logger.warning("这是一条 WARNING 消息")
-    
-    # 获取记录的日志消息
-    records = caplog.get_records("call")
-    
-    # 验证日志记录
-    debug_records = [r for r in records if r.levelname == "DEBUG"]
-    info_records = [r for r in records if r.levelname == "INFO"]
-    warning_records = [r for r in records if r.levelname == "WARNING"]
-    
-    # 验证所有级别的消息都被记录
-    assert len(debug_records) == 1
-    # 验证所有级别的消息都被记录
-    assert len(debug_records) == 1
-    assert len(info_records) == 1
-    assert len(warning_records) == 1
-    assert debug_records[0].message == "这是一条 DEBUG 消息"
-    assert info_records[0].message == "这是一条 INFO 消息"
-    assert warning_records[0].message == "这是一条 WARNING 消息"
-
-
-@patch('sys.argv')
-def test_normal_mode_output(mock_argv, caplog):
-    """测试启动时没有指定 --debug 参数，日志中没有 info/debug level 输出"""
-    import logging
-    from src.server import logger
-    
-    # 设置 caplog 级别为 WARN
-    caplog.set_level(logging.WARN)
-    
-    # 模拟命令行参数
-    mock_argv.__getitem__.side_effect = lambda idx: ['quip-mcp-server'][idx]
-    
-    # 清除之前的日志记录
-    caplog.clear()
+        assert len(resources) == 1
+        assert str(resources[0].uri) == "quip://thread1?sheet=sheet1"
+        assert "2 rows" in resources[0].description
+        mock_get_metadata.assert_not_called()
+
+
+@pytest.mark.parametrize("level,expected_debug,expected_info,expected_warn", [
+    (logging.DEBUG, 1, 1, 1),
+    (logging.WARN, 0, 0, 1),
+])
+def test_log_level_output(caplog, level, expected_debug, expected_info, expected_warn):
+    """测试 DEBUG 级别下所有日志都有输出，WARN 级别下只有 WARNING 输出"""
+    # 设置 caplog 和服务器 logger 的级别（测试结束后自动恢复）
+    caplog.set_level(level, logger=logger.name)
     
     # 输出不同级别的日志
     logger.debug("这是一条 DEBUG 消息")
@@ -550,73 +536,6 @@ def test_normal_mode_output(mock_argv, caplog):
     info_records = [r for r in records if r.levelname == "INFO"]
     warning_records = [r for r in records if r.levelname == "WARNING"]
     
-    # 验证只有 WARNING 级别的消息被记录
-    assert len(debug_records) == 0
-    assert len(info_records) == 0
-    assert len(warning_records) == 1
-    assert warning_records[0].message == "这是一条 WARNING 消息"
-
-
-@patch('os.listdir')
-@pytest.mark.asyncio
-async def test_discover_resources_empty_directory(mock_listdir):
-    """Test discovering resources from an empty storage directory"""
-    # Import the discover_resources function
-    from src.server import discover_resources
-    
-    # Setup mocks
-    mock_listdir.return_value = []
-    
-    # Create a mock storage
-    mock_storage = MagicMock()
-    mock_storage.storage_path = "/tmp/test_storage"
-    
-    # Patch the global storage_instance
-    with patch('src.server.storage_instance', mock_storage):
-        # Test with default protocol (quip://)
-        resources = await discover_resources(False)
-        
-        # Verify the result
-        assert len(resources) == 0
-        
-        # Verify the mocks were called correctly
-        mock_listdir.assert_called_once_with("/tmp/test_storage")
-
-
-@patch('os.listdir')
-@pytest.mark.asyncio
-async def test_discover_resources_error_handling(mock_listdir):
-    """Test error handling when discovering resources"""
-    # Import the discover_resources function
-    from src.server import discover_resources
-    
-    # Setup mocks to raise an exception
-    mock_listdir.side_effect = Exception("Test exception")
-    
-    # Create a mock storage
-    mock_storage = MagicMock()
-    mock_storage.storage_path = "/tmp/test_storage"
-    
-    # Patch the global storage_instance
-    with patch('src.server.storage_instance', mock_storage):
-        # Test with default protocol (quip://)
-        resources = await discover_resources(False)
-        
-        # Verify the result (should be empty list due to error handling)
-        assert len(resources) == 0
-        
-        # Verify the mocks were called correctly
-        mock_listdir.assert_called_once_with("/tmp/test_storage")
-        
-        # Reset mock for next test
-        mock_listdir.reset_mock()
-        mock_listdir.side_effect = Exception("Test exception")
-        
-        # Test with file:// protocol
-        resources = await discover_resources(True)
-        
-        # Verify the result (should be empty list due to error handling)
-        assert len(resources) == 0
-        
-        # Verify the mocks were called correctly
-        mock_listdir.assert_called_once_with("/tmp/test_storage")
+    assert [r.message for r in debug_records] == ["这是一条 DEBUG 消息"] * expected_debug
+    assert [r.message for r in info_records] == ["这是一条 INFO 消息"] * expected_info
+    assert [r.message for r in warning_records] == ["这是一条 WARNING 消息"] * expected_warn
@@ -3,24 +3,30 @@
 Tests for the storage module.
 """
 import os
-import sys
-import tempfile
 import pytest
 import json
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock
 
-# Add the parent directory to the path so we can import the src module
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.storage import StorageInterface, LocalStorage, create_storage, truncate_csv_content, format_metadata, parse_metadata
 
-from src.storage import StorageInterface, LocalStorage, create_storage, truncate_csv_content
+_HEADER = "col1,col2,col3,col4,col5"
+_DATA_ROW = "data1,data2,data3,data4,data5"
+_SMALL_CSV = "\n".join([_HEADER] + [_DATA_ROW] * 3)
+_LARGE_CSV = "\n".join([_HEADER] + [_DATA_ROW] * 1000)
 
 
-def test_create_storage_local():
+@pytest.fixture
+def local_storage(tmp_path):
+    """Create a LocalStorage instance in a per-test temporary directory"""
+    return LocalStorage(str(tmp_path), is_file_protocol=False)
+
+
+def test_create_storage_local(tmp_path):
     """Test creating a local storage instance"""
-    with tempfile.TemporaryDirectory() as temp_dir:
-        storage = create_storage(storage_type="local", storage_path=temp_dir)
-        assert isinstance(storage, LocalStorage)
-        assert storage.storage_path == temp_dir
+    storage = create_storage(storage_type="local", storage_path=str(tmp_path))
+    assert isinstance(storage, LocalStorage)
+    assert storage.storage_path == str(tmp_path)
 
 
 def test_create_storage_invalid_type():
@@ -35,48 +41,39 @@ def test_create_storage_missing_path():
         create_storage(storage_type="local")
 
 
-def test_local_storage_save_and_get_csv():
+def test_local_storage_save_and_get_csv(populated_local_storage):
     """Test saving and retrieving CSV content with local storage"""
-    with tempfile.TemporaryDirectory() as temp_dir:
-        storage = LocalStorage(temp_dir, is_file_protocol=False)
-        
-        # Test data
-        thread_id = "test_thread_id"
-        sheet_name = "test_sheet"
-        csv_content = "header1,header2\nvalue1,value2\nvalue3,value4"
-        
-        # Save CSV content
-        file_path = storage.save_csv(thread_id, sheet_name, csv_content)
-        assert os.path.exists(file_path)
-        
-        # Get CSV content
-        retrieved_content = storage.get_csv(thread_id, sheet_name)
-        assert retrieved_content == csv_content
-        
-        # Check metadata file
-        metadata_path = file_path + ".meta"
-        assert os.path.exists(metadata_path)
-        
-        with open(metadata_path, 'r') as f:
-            metadata = json.load(f)
-        
-        assert metadata["total_rows"] == 3  # Header + 2 data rows
-        assert metadata["total_size"] == len(csv_content)
-        assert metadata["resource_uri"] == f"quip://{thread_id}?sheet={sheet_name}"
-
-
-def test_local_storage_get_nonexistent_csv():
+    storage, thread_id, sheet_name, csv_content, file_path, saved_metadata = populated_local_storage
+    assert os.path.exists(file_path)
+    
+    # Get CSV content
+    retrieved_content = storage.get_csv(thread_id, sheet_name)
+    assert retrieved_content == csv_content
+    
+    # Check metadata file
+    metadata_path = file_path + ".meta"
+    assert os.path.exists(metadata_path)
+    
+    with open(metadata_path, 'rb') as f:
+        metadata = parse_metadata(f.read())
+    
+    assert metadata["total_rows"] == 3  # Header + 2 data rows
+    assert metadata["total_size"] == len(csv_content)
+    assert metadata["resource_uri"] == f"quip://{thread_id}?sheet={sheet_name}"
+    
+    # save_csv returns the same metadata it persisted
+    assert saved_metadata == metadata
+
+
+def test_local_storage_get_nonexistent_csv(local_storage):
     """Test retrieving non-existent CSV content"""
-    with tempfile.TemporaryDirectory() as temp_dir:
-        storage = LocalStorage(temp_dir, is_file_protocol=False)
-        
-        # Test data
-        thread_id = "nonexistent_thread_id"
-        sheet_name = "nonexistent_sheet"
-        
-        # Get non-existent CSV content
-        retrieved_content = storage.get_csv(thread_id, sheet_name)
-        assert retrieved_content is None
+    # Test data
+    thread_id = "nonexistent_thread_id"
+    sheet_name = "nonexistent_sheet"
+    
+    # Get non-existent CSV content
+    retrieved_content = local_storage.get_csv(thread_id, sheet_name)
+    assert retrieved_content is None
 
 
 def test_local_storage_get_resource_uri():
@@ -94,66 +91,175 @@ def test_local_storage_get_resource_uri():
     assert uri == f"quip://{thread_id}"
 
 
-def test_local_storage_get_metadata():
+def test_local_storage_get_file_path():
+    """Test building file paths, including sanitized sheet names"""
+    storage = LocalStorage("/tmp/", is_file_protocol=False)
+    
+    assert storage.get_file_path("test_thread_id") == os.path.join("/tmp", "test_thread_id.csv")
+    assert storage.get_file_path("test_thread_id", "a/b\\c") == os.path.join("/tmp", "test_thread_id-a_b_c.csv")
+    
+    # Repeated lookups return the cached path
+    assert storage.get_file_path("test_thread_id", "a/b\\c") == os.path.join("/tmp", "test_thread_id-a_b_c.csv")
+
+
+def test_local_storage_get_metadata(populated_local_storage):
     """Test getting metadata"""
-    with tempfile.TemporaryDirectory() as temp_dir:
-        storage = LocalStorage(temp_dir, is_file_protocol=False)
-        
-        # Test data
-        thread_id = "test_thread_id"
-        sheet_name = "test_sheet"
-        csv_content = "header1,header2\nvalue1,value2\nvalue3,value4"
-        
-        # Save CSV content
-        storage.save_csv(thread_id, sheet_name, csv_content)
-        
-        # Get metadata
-        metadata = storage.get_metadata(thread_id, sheet_name)
-        assert metadata["total_rows"] == 3  # Header + 2 data rows
-        assert metadata["total_size"] == len(csv_content)
-        assert metadata["resource_uri"] == f"quip://{thread_id}?sheet={sheet_name}"
-
-
-def test_local_storage_get_nonexistent_metadata():
+    storage, thread_id, sheet_name, csv_content, _, _ = populated_local_storage
+    
+    # Get metadata
+    metadata = storage.get_metadata(thread_id, sheet_name)
+    assert metadata["total_rows"] == 3  # Header + 2 data rows
+    assert metadata["total_size"] == len(csv_content)
+    assert metadata["resource_uri"] == f"quip://{thread_id}?sheet={sheet_name}"
+
+
+def test_local_storage_get_metadata_cached(local_storage):
+    """Test that metadata is served from memory after save_csv"""
+    local_storage.save_csv("test_thread_id", "test_sheet", "header1,header2\nvalue1,value2")
+    
+    with patch('builtins.open') as mock_open:
+        metadata = local_storage.get_metadata("test_thread_id", "test_sheet")
+        mock_open.assert_not_called()
+    assert metadata["total_rows"] == 2
+    
+    # Mutating the returned dict must not affect the cached copy
+    metadata["is_truncated"] = True
+    assert "is_truncated" not in local_storage.get_metadata("test_thread_id", "test_sheet")
+
+
+def test_local_storage_save_csv_leaves_no_temp_files(local_storage):
+    """Test that save_csv publishes the CSV and metadata without leaving temporary files"""
+    local_storage.save_csv("test_thread_id", "test_sheet", "header1,header2\nvalue1,value2")
+    local_storage.save_csv("test_thread_id", "test_sheet", "header1,header2\nvalue3,value4")
+    
+    assert sorted(os.listdir(local_storage.storage_path)) == [
+        "_index.json",
+        "test_thread_id-test_sheet.csv",
+        "test_thread_id-test_sheet.csv.meta"
+    ]
+    assert local_storage.get_csv("test_thread_id", "test_sheet") == "header1,header2\nvalue3,value4"
+
+
+def test_local_storage_concurrent_saves_of_same_sheet(local_storage):
+    """Test that overlapping saves of one sheet each use their own temporary files"""
+    contents = [f"header1,header2\nvalue{i},value{i}" for i in range(2)]
+    
+    def save_repeatedly(csv_content):
+        for _ in range(100):
+            local_storage.save_csv("test_thread_id", "test_sheet", csv_content)
+    
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        # Consume the results so exceptions from either writer fail the test
+        list(executor.map(save_repeatedly, contents))
+    
+    assert local_storage.get_csv("test_thread_id", "test_sheet") in contents
+    assert not [name for name in os.listdir(local_storage.storage_path) if name.endswith(".tmp")]
+
+
+def test_local_storage_reads_legacy_json_metadata(local_storage):
+    """Test that metadata files in the legacy JSON format are read without being rewritten"""
+    file_path, _ = local_storage.save_csv("test_thread_id", "test_sheet", "header1,header2\nvalue1,value2")
+    legacy_metadata = {
+        "total_rows": 2,
+        "total_size": 29,
+        "resource_uri": "quip://test_thread_id?sheet=test_sheet"
+    }
+    with open(file_path + ".meta", 'w') as f:
+        json.dump(legacy_metadata, f)
+    
+    # Use a fresh instance so nothing is served from the in-memory cache
+    storage = LocalStorage(local_storage.storage_path, is_file_protocol=False)
+    assert storage.get_metadata("test_thread_id", "test_sheet") == legacy_metadata
+    
+    with open(file_path + ".meta") as f:
+        assert json.load(f) == legacy_metadata
+
+
+def test_local_storage_get_nonexistent_metadata(local_storage):
     """Test getting metadata for non-existent CSV"""
-    with tempfile.TemporaryDirectory() as temp_dir:
-        storage = LocalStorage(temp_dir, is_file_protocol=False)
-        
-        # Test data
-        thread_id = "nonexistent_thread_id"
-        sheet_name = "nonexistent_sheet"
-        
-        # Get metadata for non-existent CSV
-        metadata = storage.get_metadata(thread_id, sheet_name)
-        assert metadata["total_rows"] == 0
-        assert metadata["total_size"] == 0
-        assert metadata["resource_uri"] == f"quip://{thread_id}?sheet={sheet_name}"
-
-
-def test_truncate_csv_content_small():
-    """Test truncating small CSV content (no truncation needed)"""
-    csv_content = "header1,header2\nvalue1,value2\nvalue3,value4"
-    max_size = 1024  # 1KB
+    # Test data
+    thread_id = "nonexistent_thread_id"
+    sheet_name = "nonexistent_sheet"
     
-    truncated, is_truncated = truncate_csv_content(csv_content, max_size)
-    assert truncated == csv_content
-    assert is_truncated is False
+    # Get metadata for non-existent CSV
+    metadata = local_storage.get_metadata(thread_id, sheet_name)
+    assert metadata["total_rows"] == 0
+    assert metadata["total_size"] == 0
+    assert metadata["resource_uri"] == f"quip://{thread_id}?sheet={sheet_name}"
 
 
-def test_truncate_csv_content_large():
-    """Test truncating large CSV content"""
-    # Create a large CSV content
-    header = "col1,col2,col3,col4,col5"
-    data_row = "data1,data2,data3,data4,data5"
+def test_local_storage_total_size_in_bytes(local_storage):
+    """Test that total_size reports the UTF-8 encoded size of the CSV content"""
+    csv_content = "名前,値\nécole,1"
+    
+    file_path, _ = local_storage.save_csv("test_thread_id", None, csv_content)
     
-    # Create 1000 rows (should be well over 10KB)
-    rows = [header] + [data_row] * 1000
-    csv_content = "\n".join(rows)
+    metadata = local_storage.get_metadata("test_thread_id")
+    assert metadata["total_size"] == len(csv_content.encode('utf-8'))
+    assert metadata["total_size"] == os.path.getsize(file_path)
+    assert local_storage.get_csv("test_thread_id") == csv_content
+
+
+def test_local_storage_save_csv_stream(local_storage):
+    """Test that streamed CSV content is saved with the same metadata as save_csv"""
+    csv_content = "header1,header2\r\nvalue1,value2\r\nvalue3,value4\r\n"
+    _, expected_metadata = local_storage.save_csv("thread1", "sheet1", csv_content)
+    file_path, metadata = local_storage.save_csv_stream("thread2", "sheet1", iter(csv_content.splitlines(keepends=True)))
+    
+    assert metadata["total_rows"] == expected_metadata["total_rows"]
+    assert metadata["total_size"] == expected_metadata["total_size"]
+    assert metadata["resource_uri"] == "quip://thread2?sheet=sheet1"
+    assert os.path.exists(file_path + ".meta")
+    assert local_storage.get_metadata("thread2", "sheet1") == metadata
+    assert local_storage.get_csv("thread2", "sheet1") == local_storage.get_csv("thread1", "sheet1")
+
+
+def test_local_storage_index(local_storage):
+    """Test that saving CSV content records its metadata in the directory index"""
+    # No index before anything is saved
+    assert local_storage.get_index() == {}
+    
+    local_storage.save_csv("thread1", None, "header1\nvalue1")
+    local_storage.save_csv("thread2", "sheet1", "header1,header2\nvalue1,value2\nvalue3,value4")
+    
+    index = local_storage.get_index()
+    assert set(index) == {"thread1.csv", "thread2-sheet1.csv"}
+    assert index["thread2-sheet1.csv"] == local_storage.get_metadata("thread2", "sheet1")
+
+
+@pytest.mark.parametrize("csv_content,max_size,expect_truncated", [
+    (_HEADER, 1024, False),      # header only
+    (_SMALL_CSV, 1024, False),   # well under the limit
+    (_SMALL_CSV, 114, False),    # exactly max_size
+    (_SMALL_CSV, 113, True),     # just over
+    (_LARGE_CSV, 1024, True),    # far over
+    (_LARGE_CSV, 60, True),      # room for the header and one row
+], ids=["header-only", "under-limit", "exact-limit", "just-over", "far-over", "header-and-one-row"])
+def test_truncate_csv_content(csv_content, max_size, expect_truncated):
+    """Test truncating CSV content around the size limit"""
+    truncated, is_truncated = truncate_csv_content(csv_content, max_size)
+    assert is_truncated is expect_truncated
+    if is_truncated:
+        assert len(truncated) <= max_size
+        assert truncated.startswith(_HEADER)  # Header should be preserved
+        assert csv_content.startswith(truncated)  # Only whole rows are kept
+        assert truncated.count("\n") < csv_content.count("\n")  # Should have fewer rows than original
+    else:
+        assert truncated == csv_content
+
+
+def test_truncate_csv_content_multibyte():
+    """Test that truncation limits the UTF-8 encoded size, not the character count"""
+    header = "名称,数量"
+    data_row = "苹果,1"
+    csv_content = "\n".join([header] + [data_row] * 100)
     
-    max_size = 1024  # 1KB
+    # Fits by characters but not by bytes
+    max_size = len(csv_content)
     
     truncated, is_truncated = truncate_csv_content(csv_content, max_size)
-    assert len(truncated) <= max_size
     assert is_truncated is True
-    assert truncated.startswith(header)  # Header should be preserved
-    assert truncated.count("\n") < 1000  # Should have fewer rows than original
\ No newline at end of file
+    assert len(truncated.encode("utf-8")) <= max_size
+    assert truncated.startswith(header)
+    assert csv_content.startswith(truncated)
+    assert truncated.endswith(data_row)